@@ -3,12 +3,86 @@ Haven AI Tools - Function calling for Anthropic Claude
 Allows the AI to fetch real patient and room data from the database
 """
 
-from typing import Dict, List, Any, Optional
-from .supabase_client import supabase
-
-
-# Tool definitions for Anthropic API
-HAVEN_TOOLS = [
+import asyncio
+import functools
+import hashlib
+import heapq
+import json
+import logging
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from itertools import islice
+from typing import Dict, List, Any, Final, Optional, Tuple
+import httpx
+from postgrest.exceptions import APIError
+from .cache import (
+    HOSPITAL_STATS_CACHE_KEY, history_cache, insights_cache, invalidate_occupancy, patient_cache,
+    room_cache, stats_cache,
+)
+from .supabase_client import POSTGREST_POOL_LIMITS, supabase
+
+logger = logging.getLogger(__name__)
+
+# Claude client for the clinical summary tool, built once so its HTTP connections are reused across calls.
+# HTTP/2 multiplexes concurrent summaries over a kept-alive connection instead of a TLS handshake each.
+ANTHROPIC_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+
+try:
+    import anthropic
+    ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+    anthropic_client = anthropic.Anthropic(
+        api_key=ANTHROPIC_API_KEY,
+        http_client=anthropic.DefaultHttpxClient(http2=True, limits=ANTHROPIC_POOL_LIMITS)
+    ) if ANTHROPIC_API_KEY else None
+except ImportError:
+    anthropic_client = None
+
+
+# Columns the tools hand back to the model; avoids shipping whole rows (photos, room/alert metadata)
+PATIENT_COLUMNS = "patient_id, name, age, gender, condition, enrollment_status"
+ROOM_COLUMNS = "room_id, room_name, room_type, floor_id, capacity"
+ALERT_COLUMNS = "id, alert_type, severity, patient_id, room_id, title, description, status, triggered_at"
+CLINICAL_SUMMARY_COLUMNS = (
+    "patient_id, name, age, gender, condition, enrollment_status, enrollment_date, baseline_vitals, baseline_crs_risk, "
+    "ecog_status, prior_treatment_lines, infusion_count, room_name, room_type, assigned_at"
+)
+
+# Severity levels shared by alerts and medical history entries (the tool schemas' enums)
+ALERT_SEVERITIES: Final = ("critical", "high", "medium", "low", "info")
+
+# Room numbers inside room names / fuzzy room queries
+_ROOM_NUMBER_RE = re.compile(r'\d+')
+_ROOM_LABEL_RE = re.compile(r'room (\d+)')
+
+# PostgREST filter grammar (, ( ) ") and its * wildcard stripped from free-text searches;
+# LIKE's own special characters (\ % _) are backslash-escaped instead (_LIKE_SPECIAL_RE)
+_SEARCH_UNSAFE_RE = re.compile(r'[,()"*]')
+_LIKE_SPECIAL_RE = re.compile(r'([\\%_])')
+
+# Rooms (and their fuzzy-match index) are shared across requests for room_cache's TTL (cleared by floor plan sync)
+ROOMS_CACHE_KEY = "room_index"
+
+# Postgres SQLSTATE for a foreign key violation (e.g. a write naming a patient that doesn't exist)
+FOREIGN_KEY_VIOLATION = "23503"
+
+# Retry policy for transient Supabase failures (_execute). postgrest-py reports the HTTP status as the
+# error code when the body isn't JSON (e.g. gateway pages), and PGRST000-003 when PostgREST can't reach Postgres.
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 2.0
+RETRY_ALWAYS_CODES = frozenset({"429", "PGRST000", "PGRST001", "PGRST002", "PGRST003"})
+RETRY_READ_CODES = frozenset({"502", "503", "504"})
+
+# Page size bounds for the list tools, so large wards don't flood the model's context
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# Tool definitions for Anthropic API (built once at import and shared by every request)
+HAVEN_TOOLS: Final[Tuple[Dict[str, Any], ...]] = (
     {
         "name": "list_all_patients",
         "description": "Get a complete list of ALL patients in the system with their basic info. Use when asked 'show all patients', 'list patients', 'describe all my patients', etc.",
@@ -18,6 +92,18 @@ HAVEN_TOOLS = [
                 "include_inactive": {
                     "type": "boolean",
                     "description": "Include inactive/discharged patients (default: false, only show active)"
+                },
+                "count_only": {
+                    "type": "boolean",
+                    "description": "Return only the number of patients (use for 'how many patients')"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Page size (default: 50, max: 200)"
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": "next_cursor from the previous page. Omit for the first page"
                 }
             },
             "required": []
@@ -92,7 +178,7 @@ HAVEN_TOOLS = [
                 "severity": {
                     "type": "string",
                     "description": "Filter by severity: 'critical', 'high', 'medium', 'low', 'info'",
-                    "enum": ["critical", "high", "medium", "low", "info"]
+                    "enum": list(ALERT_SEVERITIES)
                 },
                 "patient_id": {
                     "type": "string",
@@ -101,6 +187,18 @@ HAVEN_TOOLS = [
                 "room_id": {
                     "type": "string",
                     "description": "Get ALL alerts for specific room (any status)"
+                },
+                "count_only": {
+                    "type": "boolean",
+                    "description": "Return only the number of matching alerts (use for 'how many alerts')"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Page size (default: 50, max: 200)"
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": "next_cursor from the previous page. Omit for the first page"
                 }
             },
             "required": []
@@ -286,7 +384,7 @@ HAVEN_TOOLS = [
             "type": "object",
             "properties": {
                 "max_assignments": {
-                    "type": "number",
+                    "type": "integer",
                     "description": "Maximum number of patients to assign (default: all)"
                 }
             },
@@ -327,7 +425,7 @@ HAVEN_TOOLS = [
                     "enum": ["diagnosis", "procedure", "medication", "allergy", "vital_measurement", "lab_result", "imaging", "note", "symptom", "family_history", "social_history", ""]
                 },
                 "limit": {
-                    "type": "number",
+                    "type": "integer",
                     "description": "Number of records to return (default: 20)"
                 }
             },
@@ -360,13 +458,134 @@ HAVEN_TOOLS = [
                 "severity": {
                     "type": "string",
                     "description": "Severity level",
-                    "enum": ["critical", "high", "medium", "low", "info"]
+                    "enum": list(ALERT_SEVERITIES)
                 }
             },
             "required": ["patient_id", "entry_type", "title"]
         }
     }
-]
+)
+
+
+# Tool name -> handler that unpacks the tool input and calls the implementation
+TOOL_HANDLERS = {
+    "list_all_patients": lambda i: list_all_patients(
+        i.get("include_inactive", False),
+        limit=i.get("limit", DEFAULT_PAGE_SIZE),
+        cursor=i.get("cursor"),
+        count_only=i.get("count_only", False)
+    ),
+    "search_patients": lambda i: search_patients(i.get("query", "")),
+    "get_patient_details": lambda i: get_patient_details(i.get("patient_id", "")),
+    "get_room_status": lambda i: get_room_status(i.get("room_id", "")),
+    "list_occupied_rooms": lambda i: list_occupied_rooms(),
+    "list_available_rooms": lambda i: list_available_rooms(),
+    "get_active_alerts": lambda i: get_active_alerts(
+        severity=i.get("severity"),
+        patient_id=i.get("patient_id"),
+        room_id=i.get("room_id"),
+        limit=i.get("limit", DEFAULT_PAGE_SIZE),
+        cursor=i.get("cursor"),
+        count_only=i.get("count_only", False)
+    ),
+    "get_alerts_by_room": lambda i: get_alerts_by_room(),
+    "get_alert_details": lambda i: get_alert_details(i.get("alert_id", "")),
+    "get_hospital_stats": lambda i: get_hospital_stats(),
+    "get_patients_by_condition": lambda i: get_patients_by_condition(i.get("condition", "")),
+    "assign_patient_to_room": lambda i: assign_patient_to_room_tool(
+        i.get("patient_id", ""),
+        i.get("room_id", "")
+    ),
+    "remove_patient_from_room": lambda i: remove_patient_from_room_tool(
+        i.get("patient_id"),
+        i.get("room_id"),
+        i.get("generate_report", True)
+    ),
+    "get_patient_in_room": lambda i: get_patient_in_room_tool(i.get("room_id", "")),
+    "transfer_patient": lambda i: transfer_patient_tool(
+        patient_id=i.get("patient_id", "") or None,
+        to_room_id=i.get("to_room_id", ""),
+        from_room_id=i.get("from_room_id", "") or None
+    ),
+    "get_patient_current_room": lambda i: get_patient_room_tool(i.get("patient_id", "")),
+    "suggest_optimal_room": lambda i: suggest_optimal_room_tool(i.get("patient_id", "")),
+    "get_all_room_occupancy": lambda i: get_all_room_occupancy_tool(),
+    "remove_all_patients_from_rooms": lambda i: remove_all_patients_from_rooms_tool(i.get("confirm", False)),
+    "auto_assign_patients_to_rooms": lambda i: auto_assign_patients_to_rooms_tool(
+        int(i["max_assignments"]) if i.get("max_assignments") is not None else None
+    ),
+    "generate_patient_clinical_summary": lambda i: generate_patient_clinical_summary_tool(
+        i.get("patient_id", ""),
+        i.get("include_recommendations", True)
+    ),
+    "get_patient_medical_history": lambda i: get_patient_medical_history_tool(
+        i.get("patient_id", ""),
+        i.get("entry_type"),
+        i.get("limit", 20)
+    ),
+    "add_medical_history_entry": lambda i: add_medical_history_entry_tool(
+        i.get("patient_id", ""),
+        i.get("entry_type", ""),
+        i.get("title", ""),
+        i.get("description", ""),
+        i.get("severity")
+    ),
+}
+
+# Every advertised tool needs a handler and vice versa; a typo in either fails at import instead of mid-chat
+_mismatched_tools = {tool["name"] for tool in HAVEN_TOOLS} ^ TOOL_HANDLERS.keys()
+if _mismatched_tools:
+    raise RuntimeError(f"HAVEN_TOOLS and TOOL_HANDLERS disagree on: {sorted(_mismatched_tools)}")
+
+def _is_json_integer(value: Any) -> bool:
+    """JSON Schema integers include integral floats such as 50.0 (bool is an int subclass but not a JSON integer)"""
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, float) and value.is_integer())
+
+
+# Check for each JSON Schema type used in HAVEN_TOOLS
+_JSON_TYPE_CHECKS = {
+    "string": lambda value: isinstance(value, str),
+    "integer": _is_json_integer,
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+}
+
+
+def _compile_validator(input_schema: Dict[str, Any]):
+    """
+    Checker for one tool's input_schema, covering the subset HAVEN_TOOLS uses (required, type, enum).
+    Returns an error message for a bad call, or None. Optional parameters sent as null count as omitted.
+    """
+    required = tuple(input_schema.get("required", ()))
+    checks = tuple(
+        (name, spec["type"], _JSON_TYPE_CHECKS[spec["type"]], frozenset(spec["enum"]) if "enum" in spec else None)
+        for name, spec in input_schema.get("properties", {}).items()
+    )
+    
+    def validate(tool_input: Dict[str, Any]) -> Optional[str]:
+        for name in required:
+            value = tool_input.get(name)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                return f"Missing required parameter: {name}"
+        
+        for name, type_name, type_check, allowed in checks:
+            value = tool_input.get(name)
+            if value is None:
+                continue
+            if not type_check(value):
+                return f"Parameter {name} must be of type {type_name}"
+            if allowed is not None and value not in allowed:
+                return f"Parameter {name} must be one of: {', '.join(repr(v) for v in sorted(allowed))}"
+        
+        return None
+    
+    return validate
+
+
+# Tool name -> input checker, compiled once so execute_tool rejects malformed calls before touching the database
+TOOL_VALIDATORS = {tool["name"]: _compile_validator(tool["input_schema"]) for tool in HAVEN_TOOLS}
 
 
 # Tool execution functions
@@ -374,1108 +593,1122 @@ async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str,
     """
     Execute a tool call and return results
     """
+    handler = TOOL_HANDLERS.get(tool_name)
+    if handler is None:
+        return {"error": f"Unknown tool: {tool_name}"}
+    
+    invalid = TOOL_VALIDATORS[tool_name](tool_input)
+    if invalid:
+        return {"error": invalid}
+    
+    context = _tool_context()
+    
+    cache_key = None
+    if tool_name in CACHED_READ_TOOLS:
+        cache_key = f"{tool_name}:{json.dumps(tool_input, sort_keys=True, default=str)}"
+        cached = context.get("tool_results", {}).get(cache_key)
+        if cached is not None:
+            return cached
+    
     try:
-        if tool_name == "list_all_patients":
-            return await list_all_patients(tool_input.get("include_inactive", False))
-        
-        elif tool_name == "search_patients":
-            return await search_patients(tool_input.get("query", ""))
-        
-        elif tool_name == "get_patient_details":
-            return await get_patient_details(tool_input.get("patient_id", ""))
-        
-        elif tool_name == "get_room_status":
-            return await get_room_status(tool_input.get("room_id", ""))
-        
-        elif tool_name == "list_occupied_rooms":
-            return await list_occupied_rooms()
-        
-        elif tool_name == "list_available_rooms":
-            return await list_available_rooms()
-        
-        elif tool_name == "get_active_alerts":
-            return await get_active_alerts(
-                severity=tool_input.get("severity"),
-                patient_id=tool_input.get("patient_id"),
-                room_id=tool_input.get("room_id")
-            )
-        
-        elif tool_name == "get_alerts_by_room":
-            return await get_alerts_by_room()
-        
-        elif tool_name == "get_alert_details":
-            return await get_alert_details(tool_input.get("alert_id", ""))
-        
-        elif tool_name == "get_hospital_stats":
-            return await get_hospital_stats()
-        
-        elif tool_name == "get_patients_by_condition":
-            return await get_patients_by_condition(tool_input.get("condition", ""))
-        
-        elif tool_name == "assign_patient_to_room":
-            return await assign_patient_to_room_tool(
-                tool_input.get("patient_id", ""),
-                tool_input.get("room_id", "")
-            )
-        
-        elif tool_name == "remove_patient_from_room":
-            return await remove_patient_from_room_tool(
-                tool_input.get("patient_id"),
-                tool_input.get("room_id"),
-                tool_input.get("generate_report", True)
-            )
-        
-        elif tool_name == "get_patient_in_room":
-            return await get_patient_in_room_tool(tool_input.get("room_id", ""))
-        
-        elif tool_name == "transfer_patient":
-            patient_id_input = tool_input.get("patient_id", "") or None
-            from_room_input = tool_input.get("from_room_id", "") or None
-            to_room_input = tool_input.get("to_room_id", "")
-            
-            return await transfer_patient_tool(
-                patient_id=patient_id_input,
-                to_room_id=to_room_input,
-                from_room_id=from_room_input
-            )
-        
-        elif tool_name == "get_patient_current_room":
-            return await get_patient_room_tool(tool_input.get("patient_id", ""))
-        
-        elif tool_name == "suggest_optimal_room":
-            return await suggest_optimal_room_tool(tool_input.get("patient_id", ""))
-        
-        elif tool_name == "get_all_room_occupancy":
-            return await get_all_room_occupancy_tool()
-        
-        elif tool_name == "remove_all_patients_from_rooms":
-            return await remove_all_patients_from_rooms_tool(tool_input.get("confirm", False))
-        
-        elif tool_name == "auto_assign_patients_to_rooms":
-            return await auto_assign_patients_to_rooms_tool(tool_input.get("max_assignments"))
-        
-        elif tool_name == "generate_patient_clinical_summary":
-            return await generate_patient_clinical_summary_tool(
-                tool_input.get("patient_id", ""),
-                tool_input.get("include_recommendations", True)
-            )
-        
-        elif tool_name == "get_patient_medical_history":
-            return await get_patient_medical_history_tool(
-                tool_input.get("patient_id", ""),
-                tool_input.get("entry_type"),
-                tool_input.get("limit", 20)
-            )
-        
-        elif tool_name == "add_medical_history_entry":
-            return await add_medical_history_entry_tool(
-                tool_input.get("patient_id", ""),
-                tool_input.get("entry_type", ""),
-                tool_input.get("title", ""),
-                tool_input.get("description", ""),
-                tool_input.get("severity")
-            )
-        
-        else:
-            return {"error": f"Unknown tool: {tool_name}"}
+        result = await handler(tool_input)
+        if cache_key and "error" not in result:
+            context.setdefault("tool_results", {})[cache_key] = result
+        return result
     
     except Exception as e:
-        print(f"❌ Error executing tool {tool_name}: {e}")
+        logger.error("❌ Error executing tool %s: %s", tool_name, e)
         return {"error": str(e)}
 
 
-# Individual tool implementations
-async def list_all_patients(include_inactive: bool = False) -> Dict[str, Any]:
-    """Get ALL patients in the system"""
-    if not supabase:
-        return {"error": "Database not configured"}
+# Occupancy reads answered once per request (across Claude rounds); the AI write tools drop them.
+# Kept request-scoped because a process-local cache can't see writes handled by the other gunicorn workers.
+# get_hospital_stats has its own stats_cache entry.
+CACHED_READ_TOOLS = frozenset({
+    "list_occupied_rooms",
+    "list_available_rooms",
+    "get_all_room_occupancy",
+})
+
+# Read tools whose consecutive calls run concurrently, so their per-patient lookups can be coalesced
+CONCURRENT_READ_TOOLS = frozenset({
+    "generate_patient_clinical_summary",
+})
+
+# Tools that change data; memoized reads are dropped whenever one of these runs
+WRITE_TOOLS = frozenset({
+    "assign_patient_to_room",
+    "remove_patient_from_room",
+    "transfer_patient",
+    "remove_all_patients_from_rooms",
+    "auto_assign_patients_to_rooms",
+    "add_medical_history_entry",
+})
+
+
+async def execute_tools(tool_calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Execute every tool call from one Claude message, in order, and return the results in the same order.
+    Consecutive add_medical_history_entry calls are written with a single insert, consecutive
+    CONCURRENT_READ_TOOLS calls run together, and a read repeated with identical input is answered
+    once (until a write tool runs).
+    """
+    results: List[Dict[str, Any]] = []
+    read_memo: Dict[Tuple[str, str], Dict[str, Any]] = {}
     
-    try:
-        print(f"\n📋 Fetching ALL patients (include_inactive={include_inactive})")
-        
-        # Query patients
-        query = supabase.table("patients").select("*")
-        
-        if not include_inactive:
-            query = query.eq("enrollment_status", "active")
+    i = 0
+    while i < len(tool_calls):
+        tool_name, tool_input = tool_calls[i]
+        
+        if tool_name == "add_medical_history_entry":
+            j = i
+            while j < len(tool_calls) and tool_calls[j][0] == tool_name:
+                j += 1
+            results.extend(await _add_medical_history_entries([call[1] for call in tool_calls[i:j]]))
+            read_memo.clear()
+            i = j
+            continue
+        
+        if tool_name in CONCURRENT_READ_TOOLS:
+            j = i
+            while j < len(tool_calls) and tool_calls[j][0] == tool_name:
+                j += 1
+            keys = [(tool_name, json.dumps(call[1], sort_keys=True, default=str)) for call in tool_calls[i:j]]
+            pending = {key: call[1] for key, call in zip(keys, tool_calls[i:j]) if key not in read_memo}
+            # Start the request cache here so the concurrent calls share it (and its batch loaders)
+            _tool_context()
+            fetched = await asyncio.gather(*(execute_tool(tool_name, tool_input) for tool_input in pending.values()))
+            read_memo.update(zip(pending, fetched))
+            results.extend(read_memo[key] for key in keys)
+            i = j
+            continue
+        
+        if tool_name in WRITE_TOOLS:
+            read_memo.clear()
+            results.append(await execute_tool(tool_name, tool_input))
+        else:
+            key = (tool_name, json.dumps(tool_input, sort_keys=True, default=str))
+            if key not in read_memo:
+                read_memo[key] = await execute_tool(tool_name, tool_input)
+            results.append(read_memo[key])
+        i += 1
+    
+    return results
+
+
+# Worker threads for the blocking supabase-py calls, one per pooled HTTP connection. Kept apart from the
+# default executor so the Claude stream and other to_thread work can't starve database calls (or vice versa).
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=POSTGREST_POOL_LIMITS.max_connections, thread_name_prefix="supabase")
+
+
+async def _execute(query, read_only: bool = False):
+    """
+    Run a blocking supabase query on the _DB_EXECUTOR threads. Every query in this module goes through here,
+    so a tool waiting on the database never stalls the event loop and independent queries can overlap.
+    Transient failures (see _is_retryable) are retried with jittered exponential backoff. RPCs are sent as
+    POST, so pass read_only=True for the ones that only read to let them retry like a GET.
+    """
+    for attempt in range(1, RETRY_ATTEMPTS + 1):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_DB_EXECUTOR, query.execute)
+        except (APIError, httpx.TimeoutException) as e:
+            if attempt == RETRY_ATTEMPTS or not _is_retryable(query, e, read_only):
+                raise
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.debug("↻ Retrying %s query in %.2fs after %s", getattr(query, "http_method", "?"), delay, e)
+            await asyncio.sleep(delay)
+
+
+def _is_retryable(query, error: Exception, read_only: bool = False) -> bool:
+    """
+    Whether a failed query can safely be sent again: rate limits and PostgREST connection errors never
+    reached Postgres, while gateway errors and timeouts might have, so those are only retried for reads
+    (GET/HEAD requests, or RPCs the caller marked read_only)
+    """
+    if isinstance(error, APIError) and str(error.code) in RETRY_ALWAYS_CODES:
+        return True
+    is_read = read_only or getattr(query, "http_method", None) in ("GET", "HEAD")
+    return is_read and (isinstance(error, httpx.TimeoutException) or str(error.code) in RETRY_READ_CODES)
+
+
+async def _fetch_one(query) -> Optional[Dict[str, Any]]:
+    """
+    Fetch at most one row, or None. Uses limit(1) rather than maybe_single(): postgrest-py's
+    maybe_single() turns every APIError into a generic "204 Missing response", hiding the real error.
+    """
+    response = await _execute(query.limit(1))
+    return response.data[0] if response.data else None
+
+
+# Request-scoped cache for room assignments. Every FastAPI request runs in its
+# own task with its own context, so a chat turn that calls several tools fetches
+# occupancy once and nothing leaks into other requests.
+_TOOL_CONTEXT: ContextVar[Optional[Dict[str, Any]]] = ContextVar("haven_tool_context", default=None)
+
+
+def _tool_context() -> Dict[str, Any]:
+    """Get (or start) the cache for the current request"""
+    context = _TOOL_CONTEXT.get()
+    if context is None:
+        context = {}
+        _TOOL_CONTEXT.set(context)
+    return context
+
+
+class _BatchLoader:
+    """
+    DataLoader-style coalescing: load(key) calls made while the event loop is on the same turn are
+    answered by one batch_fn(keys) call, which returns a dict of results keyed by key.
+    """
+    
+    def __init__(self, batch_fn):
+        self._batch_fn = batch_fn
+        self._pending: Dict[Any, asyncio.Future] = {}
+    
+    def load(self, key) -> asyncio.Future:
+        if key in self._pending:
+            return self._pending[key]
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[key] = future
+        if len(self._pending) == 1:
+            # Runs after every task already scheduled for this turn has had the chance to call load()
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+    
+    async def _dispatch(self):
+        batch, self._pending = self._pending, {}
+        try:
+            found = await self._batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for key, future in batch.items():
+            future.set_result(found.get(key))
+
+
+def _tool_loader(name: str, batch_fn) -> _BatchLoader:
+    """Get (or start) the request's batch loader called `name`"""
+    context = _tool_context()
+    loaders = context.setdefault("loaders", {})
+    if name not in loaders:
+        loaders[name] = _BatchLoader(batch_fn)
+    return loaders[name]
+
+
+async def _load_clinical_summary_patients(patient_ids: List[str]) -> Dict[str, Dict]:
+    """Clinical summary patient rows (with current room) for several patients in one query"""
+    response = await _execute(supabase.table("patient_room_view").select(CLINICAL_SUMMARY_COLUMNS).in_("patient_id", patient_ids))
+    return {row["patient_id"]: row for row in (response.data or [])}
+
+
+def _build_room_index(rooms: List[Dict]) -> Dict[str, Any]:
+    """
+    Lookup tables for fuzzy_match_room, built once per rooms list. setdefault keeps the first
+    room (in list order) for each key, matching the order a linear scan would pick.
+    """
+    exact, by_number, names = {}, {}, []
+    for room in rooms:
+        room_name = room['room_name'].lower()
+        room_id = room['room_id'].lower()
+        exact.setdefault(room_name, room)
+        exact.setdefault(room_id, room)
         
-        response = query.execute()
-        patients = response.data or []
+        # A room answers to its first number ("ICU 3") and to any "room N" label in its name
+        room_num = _ROOM_NUMBER_RE.search(room_name)
+        if room_num:
+            by_number.setdefault(room_num.group(), room)
+        for label in _ROOM_LABEL_RE.findall(room_name):
+            by_number.setdefault(label, room)
         
-        print(f"   ✅ Found {len(patients)} patients")
+        names.append((room_name, room_id, room))
+    
+    return {
+        "rooms": rooms,
+        "by_id": {room['room_id']: room for room in rooms},
+        "exact": exact,
+        "by_number": by_number,
+        "names": names
+    }
+
+
+async def _get_room_index() -> Dict[str, Any]:
+    """
+    All rooms plus their lookup tables, shared across requests for room_cache's TTL (treat as read-only).
+    Concurrent misses share one fetch.
+    """
+    async def fetch():
+        response = await _execute(supabase.table("rooms").select(ROOM_COLUMNS))
+        return _build_room_index(response.data or [])
+    
+    return await room_cache.get_or_fetch(ROOMS_CACHE_KEY, fetch)
+
+
+async def _get_rooms_by_id() -> Dict[str, Dict]:
+    """All rooms keyed by room_id"""
+    return (await _get_room_index())["by_id"]
+
+
+async def _get_rooms() -> List[Dict]:
+    """All rooms as a list (for fuzzy matching)"""
+    return (await _get_room_index())["rooms"]
+
+
+async def _get_assignments_by_room() -> Dict[str, Dict]:
+    """Current patient-room assignments (with patient name/age/condition) keyed by room_id, fetched at most once per request"""
+    context = _tool_context()
+    if "assignments_by_room" not in context:
+        # Read the pre-joined view rather than embedding patients(...), which PostgREST runs as a per-row LATERAL subquery
+        response = await _execute(
+            supabase.table("patient_room_view").select("room_id, patient_id, assigned_at, name, age, condition").not_.is_("room_id", "null")
+        )
+        context["assignments_by_room"] = {a["room_id"]: a for a in (response.data or [])}
+    return context["assignments_by_room"]
+
+
+async def _get_patient(patient_id: str) -> Optional[Dict[str, Any]]:
+    """A patient's core columns (PATIENT_COLUMNS), shared across requests for patient_cache's TTL; misses aren't cached"""
+    return await patient_cache.get_or_fetch(
+        f"patient:{patient_id}",
+        lambda: _fetch_one(supabase.table("patients").select(PATIENT_COLUMNS).eq("patient_id", patient_id))
+    )
+
+
+async def _get_history_by_type(patient_id: str, entry_type: Optional[str] = None, limit: int = 20) -> Tuple[Dict[str, List[Dict]], int]:
+    """
+    A patient's `limit` most recent medical history entries, grouped by entry_type in Postgres, and their count.
+    Results are cached with the patient's history version; when the version hasn't moved the RPC
+    answers {"unchanged": true} and the cached grouping is reused.
+    """
+    cache_key = f"history:{patient_id}:{entry_type or ''}:{limit}"
+    cached = history_cache.get(cache_key)
+    params = {"pid": patient_id, "entry_kind": entry_type, "lim": limit}
+    if cached:
+        params["known_version"] = cached[0]
+    
+    response = await _execute(supabase.rpc("get_patient_history_grouped", params), read_only=True)
+    grouped = response.data or {}
+    if cached and grouped.get("unchanged"):
+        return cached[1], cached[2]
+    
+    by_type, total = grouped.get("by_type") or {}, grouped.get("total") or 0
+    if grouped.get("version") is not None:
+        history_cache.set(cache_key, (grouped["version"], by_type, total))
+    return by_type, total
+
+
+def _most_recent_entries(history_by_type: Dict[str, List[Dict]], count: int) -> List[Dict]:
+    """The newest `count` entries across the per-type lists (each already newest first)"""
+    merged = heapq.merge(*history_by_type.values(), key=lambda entry: entry.get('entry_date') or '', reverse=True)
+    return list(islice(merged, count))
+
+
+def _invalidate_assignments():
+    """Drop cached assignments, occupancy tool results and stats after a write so later tools see the new occupancy"""
+    context = _tool_context()
+    context.pop("assignments_by_room", None)
+    context.pop("tool_results", None)
+    invalidate_occupancy()
+
+
+def db_tool(fn):
+    """
+    Shared guards for the tool implementations: with no database configured, or when the tool raises,
+    the model gets an {"error": ...} result it can read instead of the chat turn failing
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not supabase:
+            return {"error": "Database not configured"}
         
-        # Enrich with room assignments
-        for patient in patients:
-            room_assignment = supabase.table("patients_room").select("room_id, assigned_at").eq("patient_id", patient["patient_id"]).execute()
-            if room_assignment.data:
-                room_id = room_assignment.data[0]["room_id"]
-                room_data = supabase.table("rooms").select("room_name, room_type").eq("room_id", room_id).execute()
-                if room_data.data:
-                    patient["current_room"] = room_data.data[0]["room_name"]
-                    patient["room_type"] = room_data.data[0]["room_type"]
-                    patient["assigned_at"] = room_assignment.data[0]["assigned_at"]
-            else:
-                patient["current_room"] = None
+        try:
+            return await fn(*args, **kwargs)
         
-        return {
-            "patients": patients,
-            "count": len(patients),
-            "active_count": sum(1 for p in patients if p.get('enrollment_status') == 'active'),
-            "assigned_count": sum(1 for p in patients if p.get('current_room'))
-        }
+        except Exception as e:
+            logger.exception("❌ Error in %s: %s", fn.__name__, e)
+            return {"error": str(e)}
     
-    except Exception as e:
-        print(f"   ❌ Error: {e}")
-        return {"error": str(e)}
+    return wrapper
+
+
+# Individual tool implementations
+@db_tool
+async def list_all_patients(
+    include_inactive: bool = False,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    count_only: bool = False
+) -> Dict[str, Any]:
+    """Get ALL patients in the system, one keyset page (ordered by patient_id) at a time"""
+    limit = _page_size(limit)
+    logger.debug("📋 Fetching ALL patients (include_inactive=%s, limit=%s, cursor=%s, count_only=%s)", include_inactive, limit, cursor, count_only)
+    
+    if count_only:
+        # HEAD request: Postgres counts, no rows are transferred
+        query = supabase.table("patients").select("patient_id", count="exact", head=True)
+    else:
+        # Query patients with their room assignment already joined
+        query = supabase.table("patient_room_view").select(f"{PATIENT_COLUMNS}, room_name")
+    
+    if not include_inactive:
+        query = query.eq("enrollment_status", "active")
+    
+    if count_only:
+        response = await _execute(query)
+        return {"count": response.count or 0}
+    
+    if cursor:
+        query = query.gt("patient_id", cursor)
+    
+    # Fetch one extra row to know whether another page exists
+    response = await _execute(query.order("patient_id").limit(limit + 1))
+    patients = response.data or []
+    has_more = len(patients) > limit
+    patients = patients[:limit]
+    
+    logger.debug("✅ Found %s patients (has_more=%s)", len(patients), has_more)
+    
+    for patient in patients:
+        patient["current_room"] = patient.pop("room_name", None)
+    
+    return {
+        "patients": patients,
+        "count": len(patients),
+        "active_count": sum(1 for p in patients if p.get('enrollment_status') == 'active'),
+        "assigned_count": sum(1 for p in patients if p.get('current_room')),
+        "next_cursor": patients[-1]["patient_id"] if has_more else None,
+        "has_more": has_more
+    }
 
 
+@db_tool
 async def search_patients(query: str) -> Dict[str, Any]:
     """Search for patients by name or ID"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Drop characters that would change the or=() filter and escape LIKE wildcards, so the query is matched literally
+    term = _SEARCH_UNSAFE_RE.sub("", query).strip()
+    if not term:
+        # Nothing left to match; an empty pattern would return arbitrary patients
+        return {"patients": [], "count": 0}
+    term = _LIKE_SPECIAL_RE.sub(r"\\\1", term)
     
-    try:
-        # Search by patient_id or name
-        response = supabase.table("patients").select("*").or_(
-            f"patient_id.ilike.%{query}%,name.ilike.%{query}%"
-        ).limit(5).execute()
-        
-        patients = response.data or []
-        
-        # Enrich with room assignments
-        for patient in patients:
-            room_assignment = supabase.table("patients_room").select("room_id").eq("patient_id", patient["patient_id"]).execute()
-            if room_assignment.data:
-                room_id = room_assignment.data[0]["room_id"]
-                room_data = supabase.table("rooms").select("room_name").eq("room_id", room_id).execute()
-                if room_data.data:
-                    patient["current_room"] = room_data.data[0]["room_name"]
-        
-        return {
-            "patients": patients,
-            "count": len(patients)
-        }
+    # Search by patient_id or name, with each patient's room assignment already joined
+    response = await _execute(supabase.table("patient_room_view").select(f"{PATIENT_COLUMNS}, room_name").or_(
+        f"patient_id.ilike.%{term}%,name.ilike.%{term}%"
+    ).limit(5))
     
-    except Exception as e:
-        return {"error": str(e)}
+    patients = response.data or []
+    
+    for patient in patients:
+        room_name = patient.pop("room_name", None)
+        if room_name:
+            patient["current_room"] = room_name
+    
+    return {
+        "patients": patients,
+        "count": len(patients)
+    }
 
 
+@db_tool
 async def get_patient_details(patient_id: str) -> Dict[str, Any]:
     """Get complete patient details including medical history and latest vitals"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    logger.debug("📋 Fetching comprehensive details for %s", patient_id)
     
-    try:
-        print(f"\n📋 Fetching comprehensive details for {patient_id}")
-        
-        # Get patient info
-        patient_response = supabase.table("patients").select("*").eq("patient_id", patient_id).single().execute()
-        
-        if not patient_response.data:
-            return {"error": f"Patient {patient_id} not found"}
-        
-        patient = patient_response.data
-        
-        # Get room assignment
-        room_assignment = supabase.table("patients_room").select("room_id, assigned_at").eq("patient_id", patient_id).execute()
-        if room_assignment.data:
-            room_id = room_assignment.data[0]["room_id"]
-            room_data = supabase.table("rooms").select("room_name, room_type").eq("room_id", room_id).execute()
-            if room_data.data:
-                patient["current_room"] = room_data.data[0]
-                patient["assigned_at"] = room_assignment.data[0]["assigned_at"]
-        
-        # Get active alerts
-        alerts_response = supabase.table("alerts").select("*").eq("patient_id", patient_id).eq("status", "active").execute()
-        patient["active_alerts"] = alerts_response.data or []
-        
-        # Get latest vitals from vital_signs table
-        try:
-            latest_vitals = supabase.table("vital_signs").select("*").eq("patient_id", patient_id).order("recorded_at", desc=True).limit(1).execute()
-            if latest_vitals.data:
-                patient["latest_vitals"] = latest_vitals.data[0]
-                print(f"   → Latest vitals: HR {latest_vitals.data[0].get('heart_rate')}, Temp {latest_vitals.data[0].get('temperature')}")
-        except:
-            patient["latest_vitals"] = None
-        
-        # Get critical medical history items
-        try:
-            # Allergies
-            allergies = supabase.table("medical_history").select("title, description, metadata").eq("patient_id", patient_id).eq("entry_type", "allergy").eq("status", "active").execute()
-            patient["allergies"] = allergies.data or []
-            
-            # Current medications
-            medications = supabase.table("medical_history").select("title, description, metadata").eq("patient_id", patient_id).eq("entry_type", "medication").eq("status", "active").execute()
-            patient["current_medications"] = medications.data or []
-            
-            # Recent diagnoses
-            diagnoses = supabase.table("medical_history").select("title, description, entry_date").eq("patient_id", patient_id).eq("entry_type", "diagnosis").order("entry_date", desc=True).limit(3).execute()
-            patient["diagnoses"] = diagnoses.data or []
-            
-            print(f"   → {len(patient['allergies'])} allergies, {len(patient['current_medications'])} active medications")
-            
-        except:
-            patient["allergies"] = []
-            patient["current_medications"] = []
-            patient["diagnoses"] = []
-        
-        return patient
+    # Postgres composes the patient with room, alerts, vitals and history in one call
+    bundle = await _execute(supabase.rpc("get_patient_bundle", {"pid": patient_id}), read_only=True)
+    patient = bundle.data
     
-    except Exception as e:
-        print(f"   ❌ Error: {e}")
-        return {"error": str(e)}
+    if not patient:
+        return {"error": f"Patient {patient_id} not found"}
+    
+    if patient["latest_vitals"]:
+        logger.debug("→ Latest vitals: HR %s, Temp %s", patient['latest_vitals'].get('heart_rate'), patient['latest_vitals'].get('temperature'))
+    
+    logger.debug("→ %s allergies, %s active medications", len(patient['allergies']), len(patient['current_medications']))
+    
+    return patient
 
 
+@db_tool
 async def get_room_status(room_id: str) -> Dict[str, Any]:
     """Get room status and occupancy"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Same matcher as assign/transfer/remove, so a query always resolves to the same room
+    room_index, assignments_by_room = await asyncio.gather(_get_room_index(), _get_assignments_by_room())
+    all_rooms = room_index["rooms"]
     
-    try:
-        # Get all rooms for fuzzy matching
-        all_rooms = supabase.table("rooms").select("*").execute()
-        
-        if not all_rooms.data:
-            return {"error": "No rooms found in database"}
-        
-        # Fuzzy match to find the room
-        matched_room = fuzzy_match_room(room_id, all_rooms.data)
-        
-        if not matched_room:
-            return {"error": f"Room '{room_id}' not found. Try: {', '.join([r['room_name'] for r in all_rooms.data[:3]])}"}
-        
-        room = matched_room
-        actual_room_id = room['room_id']
-        
-        # Check if occupied
-        assignment = supabase.table("patients_room").select("patient_id, assigned_at").eq("room_id", actual_room_id).execute()
-        
-        if assignment.data:
-            patient_id = assignment.data[0]["patient_id"]
-            patient_data = supabase.table("patients").select("name, age, condition").eq("patient_id", patient_id).execute()
-            if patient_data.data:
-                room["assigned_patient"] = patient_data.data[0]
-                room["assigned_at"] = assignment.data[0]["assigned_at"]
-                room["status"] = "occupied"
-        else:
-            room["status"] = "available"
-        
-        return room
+    if not all_rooms:
+        return {"error": "No rooms found in database"}
     
-    except Exception as e:
-        return {"error": str(e)}
+    matched_room = fuzzy_match_room(room_id, all_rooms, room_index)
+    
+    if not matched_room:
+        return {"error": f"Room '{room_id}' not found. Try: {', '.join(r['room_name'] for r in all_rooms[:3])}"}
+    
+    # Copy so the cached room row is not mutated
+    room = dict(matched_room)
+    actual_room_id = room['room_id']
+    
+    # Check if occupied
+    assignment = assignments_by_room.get(actual_room_id)
+    
+    if assignment:
+        room["assigned_patient"] = {
+            "name": assignment["name"],
+            "age": assignment["age"],
+            "condition": assignment["condition"]
+        }
+        room["assigned_at"] = assignment["assigned_at"]
+        room["status"] = "occupied"
+    else:
+        room["status"] = "available"
+    
+    return room
 
 
+@db_tool
 async def list_occupied_rooms() -> Dict[str, Any]:
     """List all occupied rooms"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Get all assigned patients with their room
+    response = await _execute(supabase.table("patient_room_view").select(
+        "room_id, room_name, patient_id, name, condition, assigned_at"
+    ).not_.is_("room_id", "null"))
     
-    try:
-        # Get all room assignments
-        assignments = supabase.table("patients_room").select("room_id, patient_id, assigned_at").execute()
-        
-        occupied_rooms = []
-        for assignment in (assignments.data or []):
-            # Get room details
-            room_data = supabase.table("rooms").select("room_name, room_type").eq("room_id", assignment["room_id"]).execute()
-            # Get patient details
-            patient_data = supabase.table("patients").select("name, condition").eq("patient_id", assignment["patient_id"]).execute()
-            
-            if room_data.data and patient_data.data:
-                occupied_rooms.append({
-                    "room_id": assignment["room_id"],
-                    "room_name": room_data.data[0]["room_name"],
-                    "patient_name": patient_data.data[0]["name"],
-                    "patient_id": assignment["patient_id"],
-                    "condition": patient_data.data[0]["condition"],
-                    "assigned_at": assignment["assigned_at"]
-                })
-        
-        return {
-            "occupied_rooms": occupied_rooms,
-            "count": len(occupied_rooms)
+    occupied_rooms = [
+        {
+            "room_id": row["room_id"],
+            "room_name": row["room_name"],
+            "patient_name": row["name"],
+            "patient_id": row["patient_id"],
+            "condition": row["condition"],
+            "assigned_at": row["assigned_at"]
         }
+        for row in (response.data or [])
+    ]
     
-    except Exception as e:
-        return {"error": str(e)}
+    return {
+        "occupied_rooms": occupied_rooms,
+        "count": len(occupied_rooms)
+    }
 
 
+@db_tool
 async def list_available_rooms() -> Dict[str, Any]:
     """List all available rooms"""
-    if not supabase:
-        return {"error": "Database not configured"}
-    
-    try:
-        # Get all patient rooms
-        all_rooms = supabase.table("rooms").select("room_id, room_name, room_type").eq("room_type", "patient").execute()
-        
-        # Get occupied room IDs
-        assignments = supabase.table("patients_room").select("room_id").execute()
-        occupied_ids = set(a["room_id"] for a in (assignments.data or []))
-        
-        # Filter to only available rooms
-        available_rooms = [
-            room for room in (all_rooms.data or [])
-            if room["room_id"] not in occupied_ids
-        ]
-        
-        return {
-            "available_rooms": available_rooms,
-            "count": len(available_rooms)
-        }
+    # Unassigned patient rooms, filtered by Postgres
+    response = await _execute(supabase.table("available_rooms").select("room_id, room_name, room_type"))
+    available_rooms = response.data or []
     
-    except Exception as e:
-        return {"error": str(e)}
+    return {
+        "available_rooms": available_rooms,
+        "count": len(available_rooms)
+    }
 
 
-async def get_active_alerts(severity: Optional[str] = None, patient_id: Optional[str] = None, room_id: Optional[str] = None) -> Dict[str, Any]:
-    """Get alerts with optional filters. Shows active alerts by default, or ALL alerts if patient_id/room_id specified."""
-    if not supabase:
-        return {"error": "Database not configured"}
+@db_tool
+async def get_active_alerts(
+    severity: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    room_id: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    count_only: bool = False
+) -> Dict[str, Any]:
+    """Get alerts with optional filters. Shows active alerts by default, or ALL alerts if patient_id/room_id specified.
     
-    try:
-        # If patient_id or room_id is specified, show ALL alerts (not just active)
-        # This is important because users asking about "Dheeraj's alerts" want to see everything
-        query = supabase.table("alerts").select("*")
-        
-        # Only filter by status='active' if NO patient/room filter is provided
-        if not patient_id and not room_id:
-            query = query.eq("status", "active")
-        
-        if severity:
-            query = query.eq("severity", severity)
-        if patient_id:
-            query = query.eq("patient_id", patient_id)
-        if room_id:
-            query = query.eq("room_id", room_id)
-        
-        response = query.order("triggered_at", desc=True).limit(50).execute()
-        
-        alerts = response.data or []
-        
-        # Group by severity AND status for summary
-        by_severity = {}
-        by_status = {}
-        for alert in alerts:
-            sev = alert.get('severity', 'unknown')
-            status = alert.get('status', 'unknown')
-            
-            if sev not in by_severity:
-                by_severity[sev] = []
-            by_severity[sev].append(alert)
-            
-            if status not in by_status:
-                by_status[status] = []
-            by_status[status].append(alert)
-        
-        active_count = len(by_status.get('active', []))
-        
-        return {
-            "alerts": alerts,
-            "total_count": len(alerts),
-            "active_count": active_count,
-            "by_severity": by_severity,
-            "by_status": by_status,
-            "critical_count": len(by_severity.get('critical', [])),
-            "high_count": len(by_severity.get('high', [])),
-            "medium_count": len(by_severity.get('medium', [])),
-        }
+    Results are paged newest first; the cursor is the "triggered_at|id" of the last alert on the previous page.
+    """
+    limit = _page_size(limit)
     
-    except Exception as e:
-        return {"error": str(e)}
+    # If patient_id or room_id is specified, show ALL alerts (not just active)
+    # This is important because users asking about "Dheeraj's alerts" want to see everything
+    if count_only:
+        # HEAD request: Postgres counts, no rows are transferred
+        query = supabase.table("alerts").select("id", count="exact", head=True)
+    else:
+        query = supabase.table("alerts").select(ALERT_COLUMNS)
+    
+    # Only filter by status='active' if NO patient/room filter is provided
+    if not patient_id and not room_id:
+        query = query.eq("status", "active")
+    
+    if severity:
+        query = query.eq("severity", severity)
+    if patient_id:
+        query = query.eq("patient_id", patient_id)
+    if room_id:
+        query = query.eq("room_id", room_id)
+    
+    if count_only:
+        response = await _execute(query)
+        return {"count": response.count or 0}
+    
+    # Keyset paging on (triggered_at, id): each page starts right after the previous one in the index instead
+    # of skipping `offset` rows, and id orders alerts triggered at the same instant
+    if cursor:
+        after_triggered_at, _, after_id = cursor.partition("|")
+        query = query.or_(
+            f'triggered_at.lt."{after_triggered_at}",and(triggered_at.eq."{after_triggered_at}",id.lt."{after_id}")'
+        )
+    
+    # Fetch one extra row to know whether another page exists
+    response = await _execute(query.order("triggered_at", desc=True).order("id", desc=True).limit(limit + 1))
+    
+    alerts = response.data or []
+    has_more = len(alerts) > limit
+    alerts = alerts[:limit]
+    
+    # Group by severity AND status for summary
+    by_severity = {}
+    by_status = {}
+    for alert in alerts:
+        sev = alert.get('severity', 'unknown')
+        status = alert.get('status', 'unknown')
+        
+        if sev not in by_severity:
+            by_severity[sev] = []
+        by_severity[sev].append(alert)
+        
+        if status not in by_status:
+            by_status[status] = []
+        by_status[status].append(alert)
+    
+    active_count = len(by_status.get('active', []))
+    
+    return {
+        "alerts": alerts,
+        "total_count": len(alerts),
+        "active_count": active_count,
+        "by_severity": by_severity,
+        "by_status": by_status,
+        "critical_count": len(by_severity.get('critical', [])),
+        "high_count": len(by_severity.get('high', [])),
+        "medium_count": len(by_severity.get('medium', [])),
+        "next_cursor": f"{alerts[-1]['triggered_at']}|{alerts[-1]['id']}" if has_more else None,
+        "has_more": has_more
+    }
 
 
+@db_tool
 async def get_alerts_by_room() -> Dict[str, Any]:
     """Get all active alerts grouped by room"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # One pre-ranked row per room (room_alert_summary view), critical rooms first
+    response = await _execute(supabase.table("room_alert_summary").select("room_id, room_name, alert_count, highest_severity, alerts").order("severity_rank", desc=True))
+    result = response.data or []
     
-    try:
-        # Get all active alerts
-        alerts = supabase.table("alerts").select("*").eq("status", "active").execute()
-        
-        # Group by room
-        room_alerts = {}
-        for alert in (alerts.data or []):
-            room_id = alert.get('room_id')
-            if room_id:
-                if room_id not in room_alerts:
-                    room_alerts[room_id] = []
-                room_alerts[room_id].append(alert)
-        
-        # Enrich with room names
-        result = []
-        for room_id, room_alert_list in room_alerts.items():
-            room_data = supabase.table("rooms").select("room_name").eq("room_id", room_id).execute()
-            room_name = room_data.data[0]['room_name'] if room_data.data else room_id
-            
-            # Find highest severity
-            severities = [a.get('severity') for a in room_alert_list]
-            severity_priority = {'critical': 4, 'high': 3, 'medium': 2, 'low': 1, 'info': 0}
-            highest_severity = max(severities, key=lambda s: severity_priority.get(s, 0))
-            
-            result.append({
-                "room_id": room_id,
-                "room_name": room_name,
-                "alert_count": len(room_alert_list),
-                "highest_severity": highest_severity,
-                "alerts": room_alert_list
-            })
-        
-        # Sort by severity (critical first)
-        result.sort(key=lambda r: severity_priority.get(r['highest_severity'], 0), reverse=True)
-        
-        return {
-            "rooms_with_alerts": result,
-            "total_rooms_affected": len(result),
-            "total_alerts": sum(r['alert_count'] for r in result)
-        }
-    
-    except Exception as e:
-        return {"error": str(e)}
+    return {
+        "rooms_with_alerts": result,
+        "total_rooms_affected": len(result),
+        "total_alerts": sum(r['alert_count'] for r in result)
+    }
 
 
+@db_tool
 async def get_alert_details(alert_id: str) -> Dict[str, Any]:
     """Get detailed information about a specific alert"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Fetch the alert with its patient embedded, alongside the (request-cached) rooms
+    alert, rooms_by_id = await asyncio.gather(
+        _fetch_one(supabase.table("alerts").select("*, patients(patient_id, name, age, condition)").eq("id", alert_id)),
+        _get_rooms_by_id()
+    )
     
-    try:
-        # Fetch the alert
-        alert_result = supabase.table("alerts").select("*").eq("id", alert_id).execute()
-        
-        if not alert_result.data or len(alert_result.data) == 0:
-            return {"error": f"Alert with ID {alert_id} not found"}
-        
-        alert = alert_result.data[0]
-        
-        # Enrich with patient information if available
-        patient_info = None
-        if alert.get("patient_id"):
-            patient_result = supabase.table("patients").select("patient_id, name, age, condition").eq("patient_id", alert["patient_id"]).execute()
-            if patient_result.data and len(patient_result.data) > 0:
-                patient_info = patient_result.data[0]
-        
-        # Enrich with room information if available
-        room_info = None
-        if alert.get("room_id"):
-            room_result = supabase.table("rooms").select("room_id, room_name, room_type").eq("room_id", alert["room_id"]).execute()
-            if room_result.data and len(room_result.data) > 0:
-                room_info = room_result.data[0]
-        
-        # Build the response
-        return {
-            "alert": alert,
-            "patient": patient_info,
-            "room": room_info,
-            "metadata": alert.get("metadata", {}),
-            "timeline": {
-                "triggered_at": alert.get("triggered_at"),
-                "acknowledged_at": alert.get("acknowledged_at"),
-                "resolved_at": alert.get("resolved_at")
-            }
-        }
+    if not alert:
+        return {"error": f"Alert with ID {alert_id} not found"}
     
-    except Exception as e:
-        return {"error": str(e)}
+    # Patient information if available
+    patient_info = _first_embedded(alert.pop("patients", None))
+    
+    # Enrich with room information if available
+    room_info = None
+    if alert.get("room_id"):
+        room = rooms_by_id.get(alert["room_id"])
+        if room:
+            room_info = {"room_id": room["room_id"], "room_name": room["room_name"], "room_type": room["room_type"]}
+    
+    # Build the response
+    return {
+        "alert": alert,
+        "patient": patient_info,
+        "room": room_info,
+        "metadata": alert.get("metadata", {}),
+        "timeline": {
+            "triggered_at": alert.get("triggered_at"),
+            "acknowledged_at": alert.get("acknowledged_at"),
+            "resolved_at": alert.get("resolved_at")
+        }
+    }
 
 
+@db_tool
 async def get_hospital_stats() -> Dict[str, Any]:
     """Get overall hospital statistics"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    cached = stats_cache.get(HOSPITAL_STATS_CACHE_KEY)
+    if cached is not None:
+        return cached
     
-    try:
-        # Count total patients
-        patients = supabase.table("patients").select("id", count='exact').eq("enrollment_status", "active").execute()
-        total_patients = patients.count if patients.count else 0
-        
-        # Count total rooms
-        rooms = supabase.table("rooms").select("id", count='exact').eq("room_type", "patient").execute()
-        total_rooms = rooms.count if rooms.count else 0
-        
-        # Count occupied rooms
-        assignments = supabase.table("patients_room").select("room_id", count='exact').execute()
-        occupied_rooms = assignments.count if assignments.count else 0
-        
-        # Count active alerts by severity
-        alerts = supabase.table("alerts").select("severity").eq("status", "active").execute()
-        alert_counts = {}
-        for alert in (alerts.data or []):
-            sev = alert.get("severity", "unknown")
-            alert_counts[sev] = alert_counts.get(sev, 0) + 1
-        
-        return {
-            "total_patients": total_patients,
-            "total_rooms": total_rooms,
-            "occupied_rooms": occupied_rooms,
-            "available_rooms": total_rooms - occupied_rooms,
-            "occupancy_rate": round((occupied_rooms / total_rooms * 100), 1) if total_rooms > 0 else 0,
-            "alerts": alert_counts,
-            "total_alerts": sum(alert_counts.values())
-        }
+    # All counts (and active alerts by severity) computed by Postgres in one call
+    counts = (await _execute(supabase.rpc("hospital_stats"), read_only=True)).data or {}
+    total_patients = counts.get("total_patients") or 0
+    total_rooms = counts.get("total_rooms") or 0
+    occupied_rooms = counts.get("occupied_rooms") or 0
+    alert_counts = counts.get("alerts") or {}
     
-    except Exception as e:
-        return {"error": str(e)}
+    stats = {
+        "total_patients": total_patients,
+        "total_rooms": total_rooms,
+        "occupied_rooms": occupied_rooms,
+        "available_rooms": total_rooms - occupied_rooms,
+        "occupancy_rate": round((occupied_rooms / total_rooms * 100), 1) if total_rooms > 0 else 0,
+        "alerts": alert_counts,
+        "total_alerts": sum(alert_counts.values())
+    }
+    stats_cache.set(HOSPITAL_STATS_CACHE_KEY, stats)
+    return stats
 
 
+@db_tool
 async def get_patients_by_condition(condition: str) -> Dict[str, Any]:
     """Find patients by condition"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Patients with their room assignment already joined
+    response = await _execute(supabase.table("patient_room_view").select(f"{PATIENT_COLUMNS}, room_name").ilike("condition", f"%{condition}%").limit(10))
     
-    try:
-        response = supabase.table("patients").select("*").ilike("condition", f"%{condition}%").limit(10).execute()
-        
-        patients = response.data or []
-        
-        # Enrich with room info
-        for patient in patients:
-            room_assignment = supabase.table("patients_room").select("room_id").eq("patient_id", patient["patient_id"]).execute()
-            if room_assignment.data:
-                room_id = room_assignment.data[0]["room_id"]
-                room_data = supabase.table("rooms").select("room_name").eq("room_id", room_id).execute()
-                if room_data.data:
-                    patient["current_room"] = room_data.data[0]["room_name"]
-        
-        return {
-            "patients": patients,
-            "condition_searched": condition,
-            "count": len(patients)
-        }
+    patients = response.data or []
     
-    except Exception as e:
-        return {"error": str(e)}
+    for patient in patients:
+        patient["current_room"] = patient.pop("room_name", None)
+    
+    return {
+        "patients": patients,
+        "condition_searched": condition,
+        "count": len(patients)
+    }
 
 
+@db_tool
 async def assign_patient_to_room_tool(patient_id: str, room_id: str) -> Dict[str, Any]:
     """Assign patient to room (write operation) - uses fuzzy matching for room names"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    logger.debug("🔄 Assigning %s to room '%s'", patient_id, room_id)
     
-    try:
-        print(f"\n🔄 Assigning {patient_id} to room '{room_id}'")
-        
-        # Fuzzy match room name to get actual room_id UUID
-        all_rooms = supabase.table("rooms").select("room_id, room_name").execute()
-        
-        if not all_rooms.data:
-            return {"error": "No rooms found in database"}
-        
-        matched_room = fuzzy_match_room(room_id, all_rooms.data)
-        
-        if not matched_room:
-            return {"error": f"Room '{room_id}' not found. Available rooms: {', '.join([r['room_name'] for r in all_rooms.data[:5]])}"}
-        
-        actual_room_id = matched_room['room_id']
-        room_name = matched_room['room_name']
-        
-        print(f"  → Matched '{room_id}' to {room_name} (UUID: {actual_room_id})")
-        
-        # Check if room is available
-        existing = supabase.table("patients_room").select("*").eq("room_id", actual_room_id).execute()
-        if existing.data:
-            return {"error": f"{room_name} is already occupied"}
-        
-        # Check if patient exists
-        patient = supabase.table("patients").select("name").eq("patient_id", patient_id).execute()
-        if not patient.data:
-            return {"error": f"Patient {patient_id} not found"}
-        
-        patient_name = patient.data[0]['name']
-        
-        # Create assignment
-        result = supabase.table("patients_room").insert({
-            "room_id": actual_room_id,
-            "patient_id": patient_id,
-            "assigned_by": "Haven AI"
-        }).execute()
-        
-        print(f"  ✅ Assigned {patient_name} to {room_name}")
-        
-        return {
-            "success": True,
-            "message": f"Assigned {patient_name} ({patient_id}) to {room_name}",
-            "patient_id": patient_id,
-            "patient_name": patient_name,
-            "room_id": actual_room_id,
-            "room_name": room_name
-        }
+    # Fuzzy match room name to get actual room_id UUID
+    room_index = await _get_room_index()
+    all_rooms = room_index["rooms"]
     
-    except Exception as e:
-        print(f"  ❌ Error: {e}")
-        return {"error": str(e)}
+    if not all_rooms:
+        return {"error": "No rooms found in database"}
+    
+    matched_room = fuzzy_match_room(room_id, all_rooms, room_index)
+    
+    if not matched_room:
+        return {"error": f"Room '{room_id}' not found. Available rooms: {', '.join(r['room_name'] for r in all_rooms[:5])}"}
+    
+    actual_room_id = matched_room['room_id']
+    room_name = matched_room['room_name']
+    
+    logger.debug("→ Matched '%s' to %s (UUID: %s)", room_id, room_name, actual_room_id)
+    
+    # Postgres checks the patient and inserts in one call; the unique room_id/patient_id
+    # indexes decide concurrent assigns, so there is no check-then-insert window
+    assigned = (await _execute(supabase.rpc("assign_patient_room", {"pid": patient_id, "target_room": actual_room_id}))).data or {}
+    
+    error = assigned.get("error")
+    if error == "patient_not_found":
+        return {"error": f"Patient {patient_id} not found"}
+    if error == "occupied":
+        return {"error": f"{room_name} is already occupied"}
+    if error == "already_assigned":
+        return {"error": f"Patient {patient_id} is already assigned to a room; use transfer_patient to move them"}
+    if not assigned:
+        return {"error": f"Failed to assign patient to {room_name}"}
+    
+    _invalidate_assignments()
+    patient_name = assigned["patient_name"]
+    
+    logger.debug("✅ Assigned %s to %s", patient_name, room_name)
+    
+    return {
+        "success": True,
+        "message": f"Assigned {patient_name} ({patient_id}) to {room_name}",
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+        "room_id": actual_room_id,
+        "room_name": room_name
+    }
 
 
 
 
+@db_tool
 async def remove_patient_from_room_tool(patient_id: Optional[str] = None, room_id: Optional[str] = None, generate_report: bool = True) -> Dict[str, Any]:
     """Remove patient from room - accepts either patient_id OR room_id"""
-    if not supabase:
-        return {"error": "Database not configured"}
-    
-    try:
-        # If room_id provided, find patient in that room using fuzzy matching
-        if room_id and not patient_id:
-            # Get all rooms for fuzzy matching
-            all_rooms = supabase.table("rooms").select("room_id, room_name").execute()
-            
-            if not all_rooms.data:
-                return {"error": "No rooms found in database"}
-            
-            # Fuzzy match to find the room
-            matched_room = fuzzy_match_room(room_id, all_rooms.data)
-            
-            if not matched_room:
-                return {"error": f"Room '{room_id}' not found. Try: {', '.join([r['room_name'] for r in all_rooms.data[:3]])}"}
-            
-            actual_room_id = matched_room['room_id']
-            room_name = matched_room['room_name']
-            
-            # Check for patient assignment
-            assignment = supabase.table("patients_room").select("patient_id").eq("room_id", actual_room_id).execute()
-            
-            if not assignment.data:
-                return {"error": f"{room_name} is already empty — no patient currently assigned"}
-            
-            patient_id = assignment.data[0]['patient_id']
-            room_id = actual_room_id
-        
-        # If patient_id provided, find their current room
-        elif patient_id and not room_id:
-            assignment = supabase.table("patients_room").select("room_id").eq("patient_id", patient_id).execute()
-            
-            if not assignment.data:
-                return {"error": f"Patient {patient_id} is not currently in any room"}
-            
-            room_id = assignment.data[0]['room_id']
+    # If room_id provided, find patient in that room using fuzzy matching
+    if room_id and not patient_id:
+        # Get all rooms for fuzzy matching
+        room_index = await _get_room_index()
+        all_rooms = room_index["rooms"]
         
-        elif not patient_id and not room_id:
-            return {"error": "Must provide either patient_id or room_id"}
+        if not all_rooms:
+            return {"error": "No rooms found in database"}
         
-        # Get patient and room names for response
-        patient_data = supabase.table("patients").select("name").eq("patient_id", patient_id).execute()
-        patient_name = patient_data.data[0]['name'] if patient_data.data else patient_id
+        # Fuzzy match to find the room
+        matched_room = fuzzy_match_room(room_id, all_rooms, room_index)
         
-        room_data = supabase.table("rooms").select("room_name").eq("room_id", room_id).execute()
-        room_name = room_data.data[0]['room_name'] if room_data.data else room_id
+        if not matched_room:
+            return {"error": f"Room '{room_id}' not found. Try: {', '.join(r['room_name'] for r in all_rooms[:3])}"}
         
-        # Remove assignment
-        supabase.table("patients_room").delete().eq("patient_id", patient_id).execute()
+        actual_room_id = matched_room['room_id']
+        room_name = matched_room['room_name']
         
-        result = {
-            "success": True,
-            "message": f"Removed {patient_name} ({patient_id}) from {room_name}",
-            "patient_id": patient_id,
-            "patient_name": patient_name,
-            "room_id": room_id,
-            "room_name": room_name
-        }
+        # Check for patient assignment (the occupant's name comes back with it)
+        assignment = await _fetch_one(supabase.table("patient_room_view").select("patient_id, name").eq("room_id", actual_room_id))
         
-        if generate_report:
-            result["report_available"] = True
-            result["report_url"] = f"/reports/discharge/{patient_id}/{room_id}"
-            result["report_message"] = "Discharge report generated and ready for download"
+        if not assignment:
+            return {"error": f"{room_name} is already empty — no patient currently assigned"}
         
-        return result
+        patient_id = assignment['patient_id']
+        patient_name = assignment['name'] or patient_id
+        room_id = actual_room_id
     
-    except Exception as e:
-        return {"error": str(e)}
+    # If patient_id provided, find their current room (and name) while the room index loads
+    elif patient_id and not room_id:
+        assignment, room_index = await asyncio.gather(
+            _fetch_one(supabase.table("patient_room_view").select("room_id, name").eq("patient_id", patient_id)),
+            _get_room_index()
+        )
+        
+        # patient_room_view has a row for every patient; room_id is null when unassigned
+        if not assignment or not assignment['room_id']:
+            return {"error": f"Patient {patient_id} is not currently in any room"}
+        
+        patient_name = assignment['name'] or patient_id
+        room_id = assignment['room_id']
+    
+    elif not patient_id and not room_id:
+        return {"error": "Must provide either patient_id or room_id"}
+    
+    # Both given: fetch the patient's name for the response alongside the room index
+    else:
+        patient_data, room_index = await asyncio.gather(
+            _get_patient(patient_id),
+            _get_room_index()
+        )
+        patient_name = patient_data['name'] if patient_data else patient_id
+    
+    rooms_by_id = room_index["by_id"]
+    room_name = rooms_by_id[room_id]['room_name'] if room_id in rooms_by_id else room_id
+    
+    # Remove assignment
+    await _execute(supabase.table("patients_room").delete().eq("patient_id", patient_id))
+    _invalidate_assignments()
+    
+    result = {
+        "success": True,
+        "message": f"Removed {patient_name} ({patient_id}) from {room_name}",
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+        "room_id": room_id,
+        "room_name": room_name
+    }
+    
+    if generate_report:
+        result["report_available"] = True
+        result["report_url"] = f"/reports/discharge/{patient_id}/{room_id}"
+        result["report_message"] = "Discharge report generated and ready for download"
+    
+    return result
 
 
+@db_tool
 async def transfer_patient_tool(patient_id: Optional[str] = None, to_room_id: str = "", from_room_id: Optional[str] = None) -> Dict[str, Any]:
     """Transfer patient from one room to another - ALWAYS queries database fresh"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    logger.debug("🔄 TRANSFER REQUEST (FRESH DATABASE QUERY)")
+    logger.debug("patient_id: %s", patient_id or 'NOT PROVIDED - will auto-detect')
+    logger.debug("from_room_id: %s", from_room_id or 'NOT PROVIDED - will auto-detect')
+    logger.debug("to_room_id: %s", to_room_id)
     
-    try:
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"\n{'='*60}")
-        print(f"🔄 [{timestamp}] TRANSFER REQUEST (FRESH DATABASE QUERY)")
-        print(f"   patient_id: {patient_id or 'NOT PROVIDED - will auto-detect'}")
-        print(f"   from_room_id: {from_room_id or 'NOT PROVIDED - will auto-detect'}")
-        print(f"   to_room_id: {to_room_id}")
-        print(f"{'='*60}")
-        
-        # Get all rooms for fuzzy matching (FRESH QUERY)
-        all_rooms = supabase.table("rooms").select("room_id, room_name").execute()
-        print(f"\n📊 Total rooms in database: {len(all_rooms.data) if all_rooms.data else 0}")
-        
-        if not all_rooms.data:
-            return {"error": "No rooms found in database"}
-        
-        # CRITICAL: If from_room_id provided (even if patient_id also provided), query database for current occupant
-        if from_room_id:
-            print(f"\n🔍 QUERYING DATABASE: Who is in from_room '{from_room_id}'?")
-            matched_from_room = fuzzy_match_room(from_room_id, all_rooms.data)
-            
-            if not matched_from_room:
-                return {"error": f"Source room '{from_room_id}' not found"}
-            
-            actual_from_room_id = matched_from_room['room_id']
-            from_room_name = matched_from_room['room_name']
-            
-            print(f"  → Matched to: {from_room_name} (UUID: {actual_from_room_id})")
-            
-            # FRESH DATABASE QUERY for current occupant
-            print(f"  → SELECT * FROM patients_room WHERE room_id = '{actual_from_room_id}'")
-            assignment = supabase.table("patients_room").select("patient_id").eq("room_id", actual_from_room_id).execute()
-            print(f"  → Database returned: {assignment.data}")
-            
-            if not assignment.data or len(assignment.data) == 0:
-                print(f"  ❌ Room is empty right now in database")
-                return {"error": f"{from_room_name} is currently empty — no patient to move"}
-            
-            patient_id = assignment.data[0]['patient_id']
-            from_room_id = actual_from_room_id
-            
-            print(f"  ✅ Found patient {patient_id} in {from_room_name} (current database state)")
-        
-        # If only patient_id provided, query for their current room
-        elif patient_id and not from_room_id:
-            print(f"\n🔍 QUERYING DATABASE: Where is patient {patient_id}?")
-            assignment = supabase.table("patients_room").select("room_id").eq("patient_id", patient_id).execute()
-            print(f"  → Database returned: {assignment.data}")
-            
-            if assignment.data:
-                from_room_id = assignment.data[0]['room_id']
-                print(f"  ✅ Patient is currently in room_id={from_room_id}")
-            else:
-                return {"error": f"Patient {patient_id} is not currently in any room"}
-        
-        else:
-            return {"error": "Must provide either patient_id or from_room_id"}
-        
-        # Fuzzy match destination room
-        matched_to_room = fuzzy_match_room(to_room_id, all_rooms.data)
-        
-        if not matched_to_room:
-            return {"error": f"Destination room '{to_room_id}' not found. Try: {', '.join([r['room_name'] for r in all_rooms.data[:3]])}"}
-        
-        actual_to_room_id = matched_to_room['room_id']
-        to_room_name = matched_to_room['room_name']
-        
-        print(f"  → Destination: {to_room_name} (ID: {actual_to_room_id})")
-        
-        # Check if destination room is available
-        dest_check = supabase.table("patients_room").select("*").eq("room_id", actual_to_room_id).execute()
-        print(f"  → Destination occupied check: {bool(dest_check.data)}")
-        
-        if dest_check.data:
-            return {"error": f"Destination room {to_room_name} is already occupied"}
-        
-        # Get from room name
-        from_room_data = supabase.table("rooms").select("room_name").eq("room_id", from_room_id).execute()
-        from_room_name = from_room_data.data[0]['room_name'] if from_room_data.data else from_room_id
-        
-        # Get patient name
-        patient_data = supabase.table("patients").select("name").eq("patient_id", patient_id).execute()
-        patient_name = patient_data.data[0]['name'] if patient_data.data else patient_id
-        
-        print(f"\n🔄 Transferring {patient_id} from {from_room_id} to {actual_to_room_id}")
-        
-        # Remove from old room
-        print(f"  → Deleting assignment: patient_id={patient_id}")
-        delete_result = supabase.table("patients_room").delete().eq("patient_id", patient_id).execute()
-        print(f"  → Delete result: {delete_result.data}")
+    # Get all rooms for fuzzy matching (occupancy below is always queried fresh). Without a source
+    # room, the patient's current location doesn't depend on the rooms list, so look it up alongside.
+    if not from_room_id and patient_id:
+        logger.debug("🔍 QUERYING DATABASE: Where is patient %s?", patient_id)
+        room_index, source = await asyncio.gather(
+            _get_room_index(),
+            _fetch_one(supabase.table("patient_room_view").select("patient_id, room_id, name").eq("patient_id", patient_id))
+        )
+    else:
+        room_index, source = await _get_room_index(), None
+    
+    all_rooms = room_index["rooms"]
+    logger.debug("📊 Total rooms in database: %s", len(all_rooms))
+    
+    if not all_rooms:
+        return {"error": "No rooms found in database"}
+    
+    # CRITICAL: If from_room_id provided (even if patient_id also provided), query database for current occupant
+    if from_room_id:
+        logger.debug("🔍 QUERYING DATABASE: Who is in from_room '%s'?", from_room_id)
+        matched_from_room = fuzzy_match_room(from_room_id, all_rooms, room_index)
         
-        if not delete_result.data:
-            print(f"  ⚠️ Warning: Delete returned no data (may still have succeeded)")
+        if not matched_from_room:
+            return {"error": f"Source room '{from_room_id}' not found"}
         
-        # Verify deletion
-        check_delete = supabase.table("patients_room").select("*").eq("patient_id", patient_id).execute()
-        print(f"  → Verification after delete: {len(check_delete.data) if check_delete.data else 0} assignments remain")
+        actual_from_room_id = matched_from_room['room_id']
+        from_room_name = matched_from_room['room_name']
         
-        if check_delete.data:
-            return {"error": f"Failed to remove patient from {from_room_name} - assignment still exists"}
+        logger.debug("→ Matched to: %s (UUID: %s)", from_room_name, actual_from_room_id)
         
-        # Add to new room
-        print(f"  → Inserting new assignment: room_id={actual_to_room_id}, patient_id={patient_id}")
-        insert_result = supabase.table("patients_room").insert({
-            "room_id": actual_to_room_id,
+        # FRESH DATABASE QUERY for current occupant (and their name)
+        source = await _fetch_one(supabase.table("patient_room_view").select("patient_id, room_id, name").eq("room_id", actual_from_room_id))
+    
+    # Only patient_id provided: their current room was fetched above
+    elif not patient_id:
+        return {"error": "Must provide either patient_id or from_room_id"}
+    
+    # Fuzzy match destination room
+    matched_to_room = fuzzy_match_room(to_room_id, all_rooms, room_index)
+    
+    if not matched_to_room:
+        return {"error": f"Destination room '{to_room_id}' not found. Try: {', '.join(r['room_name'] for r in all_rooms[:3])}"}
+    
+    actual_to_room_id = matched_to_room['room_id']
+    to_room_name = matched_to_room['room_name']
+    
+    logger.debug("→ Destination: %s (ID: %s)", to_room_name, actual_to_room_id)
+    
+    # Current occupant / location (destination occupancy is checked inside the transfer RPC)
+    logger.debug("→ Source returned: %s", source)
+    
+    # patient_room_view has a row for every patient; room_id is null when unassigned
+    if not source or not source.get("room_id"):
+        if from_room_id:
+            logger.debug("❌ Room is empty right now in database")
+            return {"error": f"{from_room_name} is currently empty — no patient to move"}
+        return {"error": f"Patient {patient_id} is not currently in any room"}
+    
+    patient_id = source['patient_id']
+    from_room_id = source['room_id']
+    patient_name = source.get('name') or patient_id
+    logger.debug("✅ Found patient %s in room_id=%s (current database state)", patient_id, from_room_id)
+    
+    # Get from room name
+    rooms_by_id = room_index["by_id"]
+    from_room_name = rooms_by_id[from_room_id]['room_name'] if from_room_id in rooms_by_id else from_room_id
+    
+    logger.debug("🔄 Transferring %s from %s to %s", patient_id, from_room_id, actual_to_room_id)
+    
+    # Check the destination and move the assignment in one transaction (locked per destination room)
+    moved = await _execute(supabase.rpc("transfer_patient", {"pid": patient_id, "new_room": actual_to_room_id}))
+    _invalidate_assignments()
+    
+    if not moved.data:
+        return {"error": f"Failed to assign patient to {to_room_name}"}
+    if moved.data.get("error") == "occupied":
+        return {"error": f"Destination room {to_room_name} is already occupied"}
+    
+    logger.debug("✅ Transfer complete: %s is now in %s", patient_id, actual_to_room_id)
+    
+    return {
+        "success": True,
+        "message": f"Transferred {patient_name} ({patient_id}) from {from_room_name} to {to_room_name}",
+        "patient_id": patient_id,
+        "patient_name": patient_name,
+        "from_room": from_room_name,
+        "from_room_id": from_room_id,
+        "to_room": to_room_name,
+        "to_room_id": actual_to_room_id
+    }
+
+
+@db_tool
+async def get_patient_room_tool(patient_id: str) -> Dict[str, Any]:
+    """Get patient's current room"""
+    room = await _fetch_one(supabase.table("patient_room_view").select("room_id, room_name, room_type, assigned_at").eq("patient_id", patient_id))
+    
+    if not room or not room['room_id']:
+        return {
             "patient_id": patient_id,
-            "assigned_by": "Haven AI"
-        }).execute()
-        print(f"  → Insert result: {insert_result.data}")
-        
-        if not insert_result.data:
-            return {"error": f"Failed to assign patient to {to_room_name}"}
-        
-        # Verify insertion
-        check_insert = supabase.table("patients_room").select("*").eq("patient_id", patient_id).execute()
-        print(f"  → Verification after insert: {check_insert.data}")
-        
-        if not check_insert.data or check_insert.data[0]['room_id'] != actual_to_room_id:
-            return {"error": "Transfer verification failed - patient may not be in correct room"}
-        
-        print(f"  ✅ Transfer verified: {patient_id} is now in {actual_to_room_id}")
-        
+            "in_room": False,
+            "message": f"Patient {patient_id} is not currently assigned to any room"
+        }
+    
+    if room['room_name']:
         return {
-            "success": True,
-            "message": f"Transferred {patient_name} ({patient_id}) from {from_room_name} to {to_room_name}",
             "patient_id": patient_id,
-            "patient_name": patient_name,
-            "from_room": from_room_name,
-            "from_room_id": from_room_id,
-            "to_room": to_room_name,
-            "to_room_id": actual_to_room_id
+            "in_room": True,
+            "room_id": room['room_id'],
+            "room_name": room['room_name'],
+            "room_type": room['room_type'],
+            "assigned_at": room['assigned_at']
         }
     
-    except Exception as e:
-        print(f"❌ Error in transfer_patient_tool: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"error": str(e)}
+    return {"error": "Room data not found"}
 
 
-async def get_patient_room_tool(patient_id: str) -> Dict[str, Any]:
-    """Get patient's current room"""
-    if not supabase:
-        return {"error": "Database not configured"}
-    
+def _page_size(limit: Any) -> int:
+    """Clamp a tool-supplied page size to 1..MAX_PAGE_SIZE"""
     try:
-        assignment = supabase.table("patients_room").select("room_id, assigned_at").eq("patient_id", patient_id).execute()
-        
-        if not assignment.data:
-            return {
-                "patient_id": patient_id,
-                "in_room": False,
-                "message": f"Patient {patient_id} is not currently assigned to any room"
-            }
-        
-        room_id = assignment.data[0]['room_id']
-        room_data = supabase.table("rooms").select("*").eq("room_id", room_id).execute()
-        
-        if room_data.data:
-            return {
-                "patient_id": patient_id,
-                "in_room": True,
-                "room_id": room_id,
-                "room_name": room_data.data[0]['room_name'],
-                "room_type": room_data.data[0]['room_type'],
-                "assigned_at": assignment.data[0]['assigned_at']
-            }
-        
-        return {"error": "Room data not found"}
-    
-    except Exception as e:
-        return {"error": str(e)}
+        return max(1, min(int(limit), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def _first_embedded(value: Any) -> Optional[Dict]:
+    """Return the first row of an embedded resource (PostgREST returns a list for to-many embeds)"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
 
 
-def fuzzy_match_room(query: str, rooms: List[Dict]) -> Optional[Dict]:
-    """Fuzzy match room name - finds BEST match with priority"""
+def fuzzy_match_room(query: str, rooms: List[Dict], index: Optional[Dict[str, Any]] = None) -> Optional[Dict]:
+    """Fuzzy match room name - finds BEST match with priority (pass the cached room index to skip rebuilding it)"""
     if not rooms:
         return None
     
+    if index is None:
+        index = _build_room_index(rooms)
+    
     query_lower = query.lower().strip()
     
-    # Extract number if present
-    import re
-    query_num = re.search(r'\d+', query)
+    # Priority 1: Exact match (case-insensitive) on name or id
+    room = index["exact"].get(query_lower)
+    if room:
+        return room
     
-    # Priority 1: Exact match (case-insensitive)
-    for room in rooms:
-        room_name = room['room_name'].lower()
-        room_id = room['room_id'].lower()
-        
-        if query_lower == room_name or query_lower == room_id:
+    # Priority 2: Exact number match ("5" → "Room 5", not "Room 2" or "Room 55")
+    query_num = _ROOM_NUMBER_RE.search(query)
+    if query_num:
+        room = index["by_number"].get(query_num.group())
+        if room:
             return room
     
-    # Priority 2: Exact number match ("5" → "Room 5", not "Room 2")
-    if query_num:
-        query_number = query_num.group()
-        for room in rooms:
-            room_name = room['room_name']
-            # Match ONLY if the exact number is in the name
-            # "5" should match "Room 5" but NOT "Room 2" or "Room 25"
-            if f"Room {query_number}" in room_name or f"room {query_number}" in room_name.lower():
-                return room
-            # Also check for exact match in room ID
-            room_num = re.search(r'\d+', room_name)
-            if room_num and room_num.group() == query_number:
-                # Double-check it's the right match
-                if query_number in room_name:
-                    return room
-    
-    # Priority 3: Partial match (last resort)
-    for room in rooms:
-        room_name = room['room_name'].lower()
-        room_id = room['room_id'].lower()
-        
+    # Priority 3: Partial match (last resort, the only scan)
+    for room_name, room_id, room in index["names"]:
         if query_lower in room_name or query_lower in room_id:
             return room
     
-    # No match found
     return None
 
 
+@db_tool
 async def get_patient_in_room_tool(room_id: str) -> Dict[str, Any]:
     """Find which patient is in a specific room - ALWAYS queries fresh from database"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    logger.debug("🔍 FRESH QUERY: Checking room '%s'", room_id)
     
-    try:
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"\n🔍 [{timestamp}] FRESH QUERY: Checking room '{room_id}'")
-        
-        # Get all rooms for fuzzy matching (fresh query)
-        all_rooms = supabase.table("rooms").select("room_id, room_name").execute()
-        print(f"  → Total rooms in database: {len(all_rooms.data) if all_rooms.data else 0}")
-        
-        if not all_rooms.data:
-            return {"error": "No rooms found in database"}
-        
-        # Fuzzy match to find the room
-        matched_room = fuzzy_match_room(room_id, all_rooms.data)
-        
-        if not matched_room:
-            return {"error": f"Room '{room_id}' not found. Available rooms: {', '.join([r['room_name'] for r in all_rooms.data[:5]])}"}
-        
-        actual_room_id = matched_room['room_id']
-        room_name = matched_room['room_name']
-        
-        print(f"  → Matched '{room_id}' to: {room_name} (ID: {actual_room_id})")
-        
-        # CRITICAL: Fresh query from patients_room table
-        print(f"  → Querying patients_room table for room_id = {actual_room_id}")
-        assignment = supabase.table("patients_room").select("patient_id, assigned_at").eq("room_id", actual_room_id).execute()
-        
-        print(f"  → Assignment data: {assignment.data}")
-        print(f"  → Is occupied: {bool(assignment.data)}")
-        
-        if not assignment.data:
-            return {
-                "room_id": actual_room_id,
-                "room_name": room_name,
-                "occupied": False,
-                "message": f"{room_name} is currently empty"
-            }
-        
-        patient_id = assignment.data[0]['patient_id']
-        
-        # Get patient details
-        patient = supabase.table("patients").select("name, age, condition").eq("patient_id", patient_id).execute()
-        
-        if patient.data:
-            return {
-                "room_id": actual_room_id,
-                "room_name": room_name,
-                "occupied": True,
-                "patient_id": patient_id,
-                "patient_name": patient.data[0]['name'],
-                "patient_age": patient.data[0]['age'],
-                "patient_condition": patient.data[0]['condition'],
-                "assigned_at": assignment.data[0]['assigned_at']
-            }
-        
-        return {"error": "Patient data not found"}
+    # Get all rooms for fuzzy matching (occupancy below is always queried fresh)
+    room_index = await _get_room_index()
+    all_rooms = room_index["rooms"]
+    logger.debug("→ Total rooms in database: %s", len(all_rooms))
     
-    except Exception as e:
-        return {"error": str(e)}
+    if not all_rooms:
+        return {"error": "No rooms found in database"}
+    
+    # Fuzzy match to find the room
+    matched_room = fuzzy_match_room(room_id, all_rooms, room_index)
+    
+    if not matched_room:
+        return {"error": f"Room '{room_id}' not found. Available rooms: {', '.join(r['room_name'] for r in all_rooms[:5])}"}
+    
+    actual_room_id = matched_room['room_id']
+    room_name = matched_room['room_name']
+    
+    logger.debug("→ Matched '%s' to: %s (ID: %s)", room_id, room_name, actual_room_id)
+    
+    # CRITICAL: Fresh query of the current occupant (patient details joined in)
+    logger.debug("→ Querying patient_room_view for room_id = %s", actual_room_id)
+    patient = await _fetch_one(supabase.table("patient_room_view").select("patient_id, name, age, condition, assigned_at").eq("room_id", actual_room_id))
+    
+    logger.debug("→ Assignment data: %s", patient)
+    logger.debug("→ Is occupied: %s", bool(patient))
+    
+    if not patient:
+        return {
+            "room_id": actual_room_id,
+            "room_name": room_name,
+            "occupied": False,
+            "message": f"{room_name} is currently empty"
+        }
+    
+    return {
+        "room_id": actual_room_id,
+        "room_name": room_name,
+        "occupied": True,
+        "patient_id": patient['patient_id'],
+        "patient_name": patient['name'],
+        "patient_age": patient['age'],
+        "patient_condition": patient['condition'],
+        "assigned_at": patient['assigned_at']
+    }
 
 
+@db_tool
 async def suggest_optimal_room_tool(patient_id: str) -> Dict[str, Any]:
     """Suggest best available room for patient"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Get patient info alongside the first few free patient rooms (available_rooms view anti-joins in Postgres)
+    patient, available = await asyncio.gather(
+        _get_patient(patient_id),
+        _execute(supabase.table("available_rooms").select("room_id, room_name", count="exact").order("room_name").limit(3))
+    )
+    if not patient:
+        return {"error": f"Patient {patient_id} not found"}
     
-    try:
-        # Get patient info
-        patient = supabase.table("patients").select("condition").eq("patient_id", patient_id).execute()
-        if not patient.data:
-            return {"error": f"Patient {patient_id} not found"}
-        
-        condition = patient.data[0].get('condition', '').lower()
-        
-        # Get all patient rooms
-        all_rooms = supabase.table("rooms").select("room_id, room_name, room_type").eq("room_type", "patient").execute()
-        
-        # Get occupied room IDs
-        assignments = supabase.table("patients_room").select("room_id").execute()
-        occupied_ids = set(a["room_id"] for a in (assignments.data or []))
-        
-        # Filter to available rooms
-        available_rooms = [
-            room for room in (all_rooms.data or [])
-            if room["room_id"] not in occupied_ids
-        ]
-        
-        if not available_rooms:
-            return {"error": "No available rooms", "suggestion": "All patient rooms are currently occupied"}
-        
-        # Simple suggestion logic - could be enhanced with more criteria
-        suggested_room = available_rooms[0]  # For now, just suggest first available
-        
-        return {
-            "patient_id": patient_id,
-            "patient_condition": patient.data[0].get('condition'),
-            "suggested_room": suggested_room['room_name'],
-            "suggested_room_id": suggested_room['room_id'],
-            "reason": "Next available patient room",
-            "total_available": len(available_rooms),
-            "other_options": [r['room_name'] for r in available_rooms[1:3]]  # Show 2 alternatives
-        }
+    available_rooms = available.data or []
     
-    except Exception as e:
-        return {"error": str(e)}
+    if not available_rooms:
+        return {"error": "No available rooms", "suggestion": "All patient rooms are currently occupied"}
+    
+    # Simple suggestion logic - could be enhanced with more criteria
+    suggested_room = available_rooms[0]  # For now, just suggest first available
+    
+    return {
+        "patient_id": patient_id,
+        "patient_condition": patient.get('condition'),
+        "suggested_room": suggested_room['room_name'],
+        "suggested_room_id": suggested_room['room_id'],
+        "reason": "Next available patient room",
+        "total_available": available.count or len(available_rooms),
+        "other_options": [r['room_name'] for r in available_rooms[1:3]]  # Show 2 alternatives
+    }
 
 
+@db_tool
 async def get_all_room_occupancy_tool() -> Dict[str, Any]:
     """Get complete list of all rooms with their occupants"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Get all rooms and the patients currently assigned to them (both request-cached)
+    all_rooms, assignment_map = await asyncio.gather(_get_rooms(), _get_assignments_by_room())
     
-    try:
-        # Get all rooms
-        rooms = supabase.table("rooms").select("room_id, room_name, room_type").eq("room_type", "patient").execute()
-        
-        # Get all assignments
-        assignments = supabase.table("patients_room").select("room_id, patient_id, assigned_at").execute()
-        assignment_map = {a['room_id']: a for a in (assignments.data or [])}
-        
-        # Build occupancy list
-        room_list = []
-        for room in (rooms.data or []):
-            room_info = {
-                "room_id": room['room_id'],
-                "room_name": room['room_name'],
-                "status": "available"
-            }
-            
-            if room['room_id'] in assignment_map:
-                assignment = assignment_map[room['room_id']]
-                # Get patient name
-                patient = supabase.table("patients").select("name, condition").eq("patient_id", assignment['patient_id']).execute()
-                if patient.data:
-                    room_info["status"] = "occupied"
-                    room_info["patient_id"] = assignment['patient_id']
-                    room_info["patient_name"] = patient.data[0]['name']
-                    room_info["patient_condition"] = patient.data[0].get('condition')
-                    room_info["assigned_at"] = assignment['assigned_at']
-            
-            room_list.append(room_info)
-        
-        occupied_count = sum(1 for r in room_list if r['status'] == 'occupied')
-        
-        return {
-            "total_rooms": len(room_list),
-            "occupied": occupied_count,
-            "available": len(room_list) - occupied_count,
-            "rooms": room_list
+    # Build occupancy list, one dict literal per patient room
+    room_list = [
+        {
+            "room_id": room['room_id'],
+            "room_name": room['room_name'],
+            "status": "occupied",
+            "patient_id": assignment['patient_id'],
+            "patient_name": assignment['name'],
+            "patient_condition": assignment.get('condition'),
+            "assigned_at": assignment['assigned_at']
+        }
+        if (assignment := assignment_map.get(room['room_id'])) else
+        {
+            "room_id": room['room_id'],
+            "room_name": room['room_name'],
+            "status": "available"
         }
+        for room in all_rooms
+        if room['room_type'] == 'patient'
+    ]
     
-    except Exception as e:
-        return {"error": str(e)}
+    occupied_count = sum(1 for r in room_list if r['status'] == 'occupied')
+    
+    return {
+        "total_rooms": len(room_list),
+        "occupied": occupied_count,
+        "available": len(room_list) - occupied_count,
+        "rooms": room_list
+    }
 
 
+@db_tool
 async def remove_all_patients_from_rooms_tool(confirm: bool = False) -> Dict[str, Any]:
     """Batch remove all patients from rooms"""
-    if not supabase:
-        return {"error": "Database not configured"}
-    
     if not confirm:
         return {
             "error": "Confirmation required",
@@ -1483,235 +1716,105 @@ async def remove_all_patients_from_rooms_tool(confirm: bool = False) -> Dict[str
             "require_confirmation": True
         }
     
-    try:
-        # Get all current assignments
-        assignments = supabase.table("patients_room").select("patient_id, room_id").execute()
-        
-        if not assignments.data:
-            return {"message": "No patients currently in rooms", "removed": 0}
-        
-        removed_count = len(assignments.data)
-        
-        # Remove all assignments
-        supabase.table("patients_room").delete().neq("patient_id", "").execute()
-        
-        return {
-            "success": True,
-            "message": f"Removed {removed_count} patients from all rooms",
-            "removed_count": removed_count,
-            "all_rooms_now_available": True
-        }
+    # Remove all assignments; Postgres reports how many it deleted
+    purged = await _execute(supabase.rpc("purge_room_assignments"))
+    _invalidate_assignments()
     
-    except Exception as e:
-        return {"error": str(e)}
+    removed_count = purged.data or 0
+    if not removed_count:
+        return {"message": "No patients currently in rooms", "removed": 0}
+    
+    return {
+        "success": True,
+        "message": f"Removed {removed_count} patients from all rooms",
+        "removed_count": removed_count,
+        "all_rooms_now_available": True
+    }
 
 
+@db_tool
 async def auto_assign_patients_to_rooms_tool(max_assignments: Optional[int] = None) -> Dict[str, Any]:
     """Auto-assign unassigned patients to available rooms"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    # Pair unassigned active patients with free rooms and insert the assignments in one atomic RPC
+    result = await _execute(supabase.rpc("auto_assign_patients", {"max_count": max_assignments or None}))
+    auto_assigned = result.data or {}
+    unassigned_count = auto_assigned.get("unassigned_count") or 0
+    available_count = auto_assigned.get("available_count") or 0
     
-    try:
-        # Get all patients
-        all_patients = supabase.table("patients").select("patient_id, name").eq("enrollment_status", "active").execute()
-        
-        # Get currently assigned patients
-        assignments = supabase.table("patients_room").select("patient_id").execute()
-        assigned_ids = set(a['patient_id'] for a in (assignments.data or []))
-        
-        # Filter to unassigned patients
-        unassigned = [p for p in (all_patients.data or []) if p['patient_id'] not in assigned_ids]
-        
-        # Get available rooms
-        all_rooms = supabase.table("rooms").select("room_id, room_name").eq("room_type", "patient").execute()
-        occupied_room_ids = set(a['room_id'] for a in (assignments.data or []))
-        available_rooms = [r for r in (all_rooms.data or []) if r['room_id'] not in occupied_room_ids]
-        
-        if not available_rooms:
-            return {"error": "No available rooms"}
-        
-        if not unassigned:
-            return {"message": "All active patients are already assigned to rooms"}
-        
-        # Determine how many to assign
-        num_to_assign = min(len(unassigned), len(available_rooms))
-        if max_assignments:
-            num_to_assign = min(num_to_assign, max_assignments)
-        
-        # Make assignments
-        new_assignments = []
-        for i in range(num_to_assign):
-            patient = unassigned[i]
-            room = available_rooms[i]
-            
-            supabase.table("patients_room").insert({
-                "room_id": room['room_id'],
-                "patient_id": patient['patient_id'],
-                "assigned_by": "Haven AI Auto-Assign"
-            }).execute()
-            
-            new_assignments.append({
-                "patient_id": patient['patient_id'],
-                "patient_name": patient['name'],
-                "room_id": room['room_id'],
-                "room_name": room['room_name']
-            })
-        
-        return {
-            "success": True,
-            "message": f"Auto-assigned {num_to_assign} patients to rooms",
-            "assignments": new_assignments,
-            "assigned_count": num_to_assign,
-            "remaining_unassigned": len(unassigned) - num_to_assign,
-            "remaining_available_rooms": len(available_rooms) - num_to_assign
-        }
+    if not available_count:
+        return {"error": "No available rooms"}
     
-    except Exception as e:
-        return {"error": str(e)}
-
-
-async def generate_patient_clinical_summary_tool(patient_id: str, include_recommendations: bool = True) -> Dict[str, Any]:
-    """Generate comprehensive clinical summary for a patient with AI insights"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    if not unassigned_count:
+        return {"message": "All active patients are already assigned to rooms"}
     
-    try:
-        print(f"\n📋 Generating clinical summary for {patient_id}...")
-        
-        # Get patient data
-        patient = supabase.table("patients").select("*").eq("patient_id", patient_id).execute()
-        
-        if not patient.data:
-            return {"error": f"Patient {patient_id} not found"}
-        
-        patient_info = patient.data[0]
-        
-        # Get room assignment
-        room_assignment = supabase.table("patients_room").select("room_id, assigned_at").eq("patient_id", patient_id).execute()
-        current_room = None
-        if room_assignment.data:
-            room_id = room_assignment.data[0]['room_id']
-            room_data = supabase.table("rooms").select("room_name, room_type").eq("room_id", room_id).execute()
-            if room_data.data:
-                current_room = {
-                    "room_name": room_data.data[0]['room_name'],
-                    "room_type": room_data.data[0]['room_type'],
-                    "assigned_at": room_assignment.data[0]['assigned_at']
-                }
-        
-        # Get active alerts
-        alerts = supabase.table("alerts").select("*").eq("patient_id", patient_id).eq("status", "active").execute()
-        active_alerts = alerts.data or []
-        
-        # Get alert history
-        alert_history = supabase.table("alerts").select("*").eq("patient_id", patient_id).order("triggered_at", desc=True).limit(20).execute()
-        
-        # Get medical history
-        medical_history = supabase.table("medical_history").select("*").eq("patient_id", patient_id).order("entry_date", desc=True).limit(30).execute()
-        history_entries = medical_history.data or []
-        
-        # Organize history by type
-        history_by_type = {}
-        for entry in history_entries:
-            etype = entry.get('entry_type', 'other')
-            if etype not in history_by_type:
-                history_by_type[etype] = []
-            history_by_type[etype].append(entry)
-        
-        print(f"   → Medical history: {len(history_entries)} entries across {len(history_by_type)} types")
-        
-        # Build summary data
-        summary = {
-            "patient_id": patient_id,
-            "patient_name": patient_info.get('name'),
-            "age": patient_info.get('age'),
-            "gender": patient_info.get('gender'),
-            "condition": patient_info.get('condition'),
-            "enrollment_status": patient_info.get('enrollment_status'),
-            "enrollment_date": patient_info.get('enrollment_date'),
-            "current_room": current_room,
-            "active_alerts_count": len(active_alerts),
-            "active_alerts": active_alerts[:5],
-            "alert_history_count": len(alert_history.data or []),
-            "baseline_vitals": patient_info.get('baseline_vitals'),
-            "baseline_crs_risk": patient_info.get('baseline_crs_risk'),
-            "ecog_status": patient_info.get('ecog_status'),
-            "prior_treatment_lines": patient_info.get('prior_treatment_lines'),
-            "infusion_count": patient_info.get('infusion_count'),
-            "medical_history": {
-                "total_entries": len(history_entries),
-                "entries_by_type": history_by_type,
-                "allergies": history_by_type.get('allergy', []),
-                "medications": history_by_type.get('medication', []),
-                "procedures": history_by_type.get('procedure', []),
-                "recent_entries": history_entries[:5]
-            }
-        }
-        
-        # Generate AI clinical insights
-        recommendations = []
-        risk_factors = []
-        key_concerns = []
-        
-        if include_recommendations:
-            try:
-                import os
-                import anthropic
-                ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-                
-                if ANTHROPIC_API_KEY:
-                    claude_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-                    
-                    # Build clinical context
-                    vitals_str = ""
-                    if patient_info.get('baseline_vitals'):
-                        vitals = patient_info['baseline_vitals']
-                        vitals_str = f"""Baseline Vitals:
-- HR: {vitals.get('heart_rate', 'N/A')} bpm
-- BP: {vitals.get('blood_pressure', 'N/A')}
-- Temp: {vitals.get('temperature', 'N/A')}
-- RR: {vitals.get('respiratory_rate', 'N/A')} /min
-- SpO2: {vitals.get('oxygen_saturation', 'N/A')}%"""
-                    
-                    alerts_str = "\n".join([
-                        f"- {a.get('severity', '').upper()}: {a.get('title')}"
-                        for a in (alert_history.data or [])[:5]
-                    ])
-                    
-                    # Build medical history summary
-                    allergies_str = "\n".join([f"- {a.get('title')}: {a.get('description', 'See chart')}" for a in history_by_type.get('allergy', [])[:3]])
-                    meds_str = "\n".join([f"- {m.get('title')}" for m in history_by_type.get('medication', [])[:5]])
-                    procedures_str = "\n".join([f"- {p.get('title')} ({p.get('entry_date', '')[:10]})" for p in history_by_type.get('procedure', [])[:3]])
-                    
-                    clinical_context = f"""**Patient:** {patient_info.get('name')} ({patient_id})
-**Age:** {patient_info.get('age')} | **Gender:** {patient_info.get('gender')}
-**Diagnosis:** {patient_info.get('condition')}
-**ECOG:** {patient_info.get('ecog_status')} | **Prior Lines:** {patient_info.get('prior_treatment_lines')}
-**CRS Risk:** {patient_info.get('baseline_crs_risk')}
-**Location:** {current_room['room_name'] if current_room else 'Not assigned'}
+    new_assignments = auto_assigned.get("assignments") or []
+    num_to_assign = len(new_assignments)
+    _invalidate_assignments()
+    
+    return {
+        "success": True,
+        "message": f"Auto-assigned {num_to_assign} patients to rooms",
+        "assignments": new_assignments,
+        "assigned_count": num_to_assign,
+        "remaining_unassigned": unassigned_count - num_to_assign,
+        "remaining_available_rooms": available_count - num_to_assign
+    }
 
-{vitals_str}
 
-**Medical History ({len(history_entries)} total entries):**
-Allergies:
-{allergies_str if allergies_str else '- None documented'}
+class _ClinicalInsightsParser:
+    """Splits Claude's answer into its three sections (up to 3 lines each) as streamed text arrives"""
+    
+    def __init__(self):
+        self.sections = {"KEY CONCERNS:": [], "RISK FACTORS:": [], "RECOMMENDATIONS:": []}
+        self._current = None
+        self._partial = ""
+    
+    def feed(self, text: str):
+        # Only complete lines are parsed; the trailing fragment waits for the next chunk
+        *lines, self._partial = (self._partial + text).split("\n")
+        for line in lines:
+            self._parse_line(line)
+    
+    def close(self):
+        self._parse_line(self._partial)
+        self._partial = ""
+    
+    @property
+    def complete(self) -> bool:
+        return all(len(lines) == 3 for lines in self.sections.values())
+    
+    def result(self) -> Tuple[List[str], List[str], List[str]]:
+        return self.sections["KEY CONCERNS:"], self.sections["RISK FACTORS:"], self.sections["RECOMMENDATIONS:"]
+    
+    def _parse_line(self, line: str):
+        line = line.strip()
+        # Headers may come back wrapped in markdown ("**KEY CONCERNS:**")
+        header = line.strip("*#_ ")
+        if header in self.sections:
+            self._current = self.sections[header]
+        elif self._current is not None and len(self._current) < 3 and any(c.isalpha() for c in line):
+            self._current.append(line)
 
-Current Medications:
-{meds_str if meds_str else '- None documented'}
 
-Previous Procedures:
-{procedures_str if procedures_str else '- None documented'}
-
-**Recent Alerts ({len(active_alerts)} active):**
-{alerts_str if alerts_str else 'No alerts'}"""
-                    
-                    # Get clinical analysis from Claude
-                    analysis = claude_client.messages.create(
-                        model="claude-haiku-4-5-20251001",
-                        max_tokens=800,
-                        messages=[{
-                            "role": "user",
-                            "content": f"""Analyze this patient and provide clinical guidance:
+async def _clinical_insights(clinical_context: str) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Claude's key concerns, risk factors and recommendations for a clinical context, cached by a
+    hash of the context so repeat summaries of an unchanged patient skip the model call.
+    """
+    cache_key = f"clinical_insights:{hashlib.blake2b(clinical_context.encode(), digest_size=16).hexdigest()}"
+    cached = insights_cache.get(cache_key)
+    if cached is not None:
+        return tuple(list(section) for section in cached)
+    
+    def stream_insights():
+        # Parse sections while the answer streams in, and hang up once all three are full
+        parser = _ClinicalInsightsParser()
+        with anthropic_client.messages.stream(
+            model="claude-haiku-4-5-20251001",
+            max_tokens=800,
+            messages=[{
+                "role": "user",
+                "content": f"""Analyze this patient and provide clinical guidance:
 
 {clinical_context}
 
@@ -1733,110 +1836,217 @@ RECOMMENDATIONS:
 3. [Follow-up steps]
 
 Be concise, clinical, actionable."""
-                        }]
-                    )
-                    
-                    insights_text = analysis.content[0].text
-                    
-                    # Parse Claude's response
-                    if "KEY CONCERNS:" in insights_text:
-                        concerns_section = insights_text.split("KEY CONCERNS:")[1].split("RISK FACTORS:")[0]
-                        key_concerns = [line.strip() for line in concerns_section.split('\n') if line.strip() and any(c.isalpha() for c in line)][:3]
-                    
-                    if "RISK FACTORS:" in insights_text:
-                        risk_section = insights_text.split("RISK FACTORS:")[1].split("RECOMMENDATIONS:")[0]
-                        risk_factors = [line.strip() for line in risk_section.split('\n') if line.strip() and any(c.isalpha() for c in line)][:3]
-                    
-                    if "RECOMMENDATIONS:" in insights_text:
-                        rec_section = insights_text.split("RECOMMENDATIONS:")[1]
-                        recommendations = [line.strip() for line in rec_section.split('\n') if line.strip() and any(c.isalpha() for c in line)][:3]
-                    
-                    print(f"   ✅ AI insights generated")
-                    
-            except Exception as ai_error:
-                print(f"   ⚠️ AI insights error: {ai_error}")
-                # Fallback recommendations
-                recommendations = [
-                    "Monitor vital signs per protocol",
-                    "Review recent alert patterns",
-                    "Continue current treatment plan"
-                ]
-                risk_factors = [
-                    "Monitor for CRS symptoms if post-CAR T",
-                    "Watch for fever >38.5°C",
-                    "Track any changes in baseline vitals"
-                ]
-                key_concerns = [
-                    f"{len(active_alerts)} active alerts require attention",
-                    "Regular monitoring per ECOG status",
-                    "Treatment adherence assessment needed"
-                ]
-        
-        summary["ai_insights"] = {
-            "key_concerns": key_concerns or ["Regular monitoring recommended"],
-            "risk_factors": risk_factors or ["Standard clinical monitoring"],
-            "recommendations": recommendations or ["Continue per protocol"]
+            }]
+        ) as stream:
+            for text in stream.text_stream:
+                parser.feed(text)
+                if parser.complete:
+                    break
+        parser.close()
+        return parser.result()
+    
+    insights = await asyncio.to_thread(stream_insights)
+    insights_cache.set(cache_key, tuple(tuple(section) for section in insights))
+    return insights
+
+
+# Static clinical summary insights, built once: the fallbacks used when Claude fails and the defaults for empty sections
+FALLBACK_RECOMMENDATIONS: Final = (
+    "Monitor vital signs per protocol",
+    "Review recent alert patterns",
+    "Continue current treatment plan",
+)
+FALLBACK_RISK_FACTORS: Final = (
+    "Monitor for CRS symptoms if post-CAR T",
+    "Watch for fever >38.5°C",
+    "Track any changes in baseline vitals",
+)
+# Follows the active alert count, the one line that varies per patient
+FALLBACK_KEY_CONCERNS: Final = (
+    "Regular monitoring per ECOG status",
+    "Treatment adherence assessment needed",
+)
+DEFAULT_KEY_CONCERNS: Final = ("Regular monitoring recommended",)
+DEFAULT_RISK_FACTORS: Final = ("Standard clinical monitoring",)
+DEFAULT_RECOMMENDATIONS: Final = ("Continue per protocol",)
+
+
+@db_tool
+async def generate_patient_clinical_summary_tool(patient_id: str, include_recommendations: bool = True) -> Dict[str, Any]:
+    """Generate comprehensive clinical summary for a patient with AI insights"""
+    logger.debug("📋 Generating clinical summary for %s...", patient_id)
+    
+    # Patient (with current room from patient_room_view), alerts and history are independent; fetch them together.
+    # The patient row goes through a batch loader, so concurrent summaries share one patient query.
+    patient_info, alerts, (history_by_type, history_count) = await asyncio.gather(
+        _tool_loader("clinical_summary_patients", _load_clinical_summary_patients).load(patient_id),
+        _execute(supabase.rpc("get_patient_alerts", {"pid": patient_id, "history_limit": 20}), read_only=True),
+        _get_history_by_type(patient_id, limit=30)
+    )
+    
+    if not patient_info:
+        return {"error": f"Patient {patient_id} not found"}
+    
+    # Room assignment
+    current_room = None
+    if patient_info.get('room_name'):
+        current_room = {
+            "room_name": patient_info['room_name'],
+            "room_type": patient_info['room_type'],
+            "assigned_at": patient_info['assigned_at']
         }
-        
-        # PDF report URL
-        summary["pdf_report_url"] = f"/reports/clinical-summary/{patient_id}"
-        summary["pdf_available"] = True
-        
-        print(f"   ✅ Clinical summary generated for {patient_info.get('name')}")
-        
-        return summary
     
-    except Exception as e:
-        print(f"   ❌ Error generating summary: {e}")
-        return {"error": str(e)}
+    # Active alerts plus the last 20 of any status, from one RPC
+    patient_alerts = alerts.data or {}
+    active_alerts = patient_alerts.get("active") or []
+    alert_history = patient_alerts.get("recent") or []
+    # Sliced and counted once here; the summary, prompt and fallback all reuse these
+    active_alerts_count = len(active_alerts)
+    recent_alerts = alert_history[:5]
+    
+    logger.debug("→ Medical history: %s entries across %s types", history_count, len(history_by_type))
+    
+    # Build summary data
+    summary = {
+        "patient_id": patient_id,
+        "patient_name": patient_info.get('name'),
+        "age": patient_info.get('age'),
+        "gender": patient_info.get('gender'),
+        "condition": patient_info.get('condition'),
+        "enrollment_status": patient_info.get('enrollment_status'),
+        "enrollment_date": patient_info.get('enrollment_date'),
+        "current_room": current_room,
+        "active_alerts_count": active_alerts_count,
+        "active_alerts": active_alerts[:5],
+        "alert_history_count": len(alert_history),
+        "baseline_vitals": patient_info.get('baseline_vitals'),
+        "baseline_crs_risk": patient_info.get('baseline_crs_risk'),
+        "ecog_status": patient_info.get('ecog_status'),
+        "prior_treatment_lines": patient_info.get('prior_treatment_lines'),
+        "infusion_count": patient_info.get('infusion_count'),
+        "medical_history": {
+            "total_entries": history_count,
+            "entries_by_type": history_by_type,
+            "allergies": history_by_type.get('allergy', []),
+            "medications": history_by_type.get('medication', []),
+            "procedures": history_by_type.get('procedure', []),
+            "recent_entries": _most_recent_entries(history_by_type, 5)
+        }
+    }
+    
+    # Generate AI clinical insights
+    recommendations = []
+    risk_factors = []
+    key_concerns = []
+    
+    # Without a Claude client there's nothing to ask; the generic insights below apply
+    if include_recommendations and anthropic_client:
+        try:
+            # Build clinical context
+            vitals_str = ""
+            if patient_info.get('baseline_vitals'):
+                vitals = patient_info['baseline_vitals']
+                vitals_str = f"""Baseline Vitals:
+- HR: {vitals.get('heart_rate', 'N/A')} bpm
+- BP: {vitals.get('blood_pressure', 'N/A')}
+- Temp: {vitals.get('temperature', 'N/A')}
+- RR: {vitals.get('respiratory_rate', 'N/A')} /min
+- SpO2: {vitals.get('oxygen_saturation', 'N/A')}%"""
+            
+            # Each section is only formatted when it has entries; empty ones get their placeholder
+            alerts_str = "\n".join(
+                f"- {a.get('severity', '').upper()}: {a.get('title')}" for a in recent_alerts
+            ) if recent_alerts else "No alerts"
+            
+            # Build medical history summary
+            allergies = history_by_type.get('allergy', [])[:3]
+            allergies_str = "\n".join(
+                f"- {a.get('title')}: {a.get('description', 'See chart')}" for a in allergies
+            ) if allergies else "- None documented"
+            meds = history_by_type.get('medication', [])[:5]
+            meds_str = "\n".join(f"- {m.get('title')}" for m in meds) if meds else "- None documented"
+            procedures = history_by_type.get('procedure', [])[:3]
+            procedures_str = "\n".join(
+                f"- {p.get('title')} ({p.get('entry_date', '')[:10]})" for p in procedures
+            ) if procedures else "- None documented"
+            
+            clinical_context = f"""**Patient:** {patient_info.get('name')} ({patient_id})
+**Age:** {patient_info.get('age')} | **Gender:** {patient_info.get('gender')}
+**Diagnosis:** {patient_info.get('condition')}
+**ECOG:** {patient_info.get('ecog_status')} | **Prior Lines:** {patient_info.get('prior_treatment_lines')}
+**CRS Risk:** {patient_info.get('baseline_crs_risk')}
+**Location:** {current_room['room_name'] if current_room else 'Not assigned'}
+
+{vitals_str}
+
+**Medical History ({history_count} total entries):**
+Allergies:
+{allergies_str}
 
+Current Medications:
+{meds_str}
+
+Previous Procedures:
+{procedures_str}
 
+**Recent Alerts ({active_alerts_count} active):**
+{alerts_str}"""
+            
+            # Get clinical analysis from Claude (reused while the patient's context is unchanged)
+            key_concerns, risk_factors, recommendations = await _clinical_insights(clinical_context)
+            
+            logger.debug("✅ AI insights generated")
+            
+        except Exception as ai_error:
+            logger.warning("⚠️ AI insights error: %s", ai_error)
+            # Fallback recommendations
+            recommendations = FALLBACK_RECOMMENDATIONS
+            risk_factors = FALLBACK_RISK_FACTORS
+            key_concerns = (f"{active_alerts_count} active alerts require attention",) + FALLBACK_KEY_CONCERNS
+    
+    summary["ai_insights"] = {
+        "key_concerns": key_concerns or DEFAULT_KEY_CONCERNS,
+        "risk_factors": risk_factors or DEFAULT_RISK_FACTORS,
+        "recommendations": recommendations or DEFAULT_RECOMMENDATIONS
+    }
+    
+    # PDF report URL
+    summary["pdf_report_url"] = f"/reports/clinical-summary/{patient_id}"
+    summary["pdf_available"] = True
+    
+    logger.debug("✅ Clinical summary generated for %s", patient_info.get('name'))
+    
+    return summary
+
+
+@db_tool
 async def get_patient_medical_history_tool(patient_id: str, entry_type: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
     """Get medical history for a patient"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    limit = _page_size(limit)
+    logger.debug("📋 Fetching medical history for %s (entry type: %s, limit: %s)", patient_id, entry_type or 'all', limit)
     
-    try:
-        print(f"\n📋 Fetching medical history for {patient_id}")
-        print(f"   Entry type filter: {entry_type or 'all'}")
-        print(f"   Limit: {limit}")
-        
-        # Build query
-        query = supabase.table("medical_history").select("*").eq("patient_id", patient_id)
-        
-        if entry_type and entry_type.strip():
-            query = query.eq("entry_type", entry_type)
-        
-        response = query.order("entry_date", desc=True).limit(limit).execute()
-        
-        history_entries = response.data or []
-        
-        # Group by type for better organization
-        grouped_by_type = {}
-        for entry in history_entries:
-            etype = entry.get('entry_type', 'other')
-            if etype not in grouped_by_type:
-                grouped_by_type[etype] = []
-            grouped_by_type[etype].append(entry)
-        
-        print(f"   ✅ Found {len(history_entries)} history entries")
-        print(f"   Types: {list(grouped_by_type.keys())}")
-        
-        return {
-            "patient_id": patient_id,
-            "total_entries": len(history_entries),
-            "entries_by_type": grouped_by_type,
-            "recent_entries": history_entries[:10],  # Most recent 10
-            "has_allergies": 'allergy' in grouped_by_type,
-            "has_medications": 'medication' in grouped_by_type,
-            "entry_types_present": list(grouped_by_type.keys())
-        }
+    # Most recent entries, grouped by type in Postgres
+    grouped_by_type, total_entries = await _get_history_by_type(
+        patient_id,
+        entry_type if entry_type and entry_type.strip() else None,
+        limit
+    )
     
-    except Exception as e:
-        print(f"   ❌ Error fetching medical history: {e}")
-        return {"error": str(e)}
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("✅ Found %s history entries, types: %s", total_entries, list(grouped_by_type))
+    
+    return {
+        "patient_id": patient_id,
+        "total_entries": total_entries,
+        "entries_by_type": grouped_by_type,
+        "recent_entries": _most_recent_entries(grouped_by_type, 10),  # Most recent 10
+        "has_allergies": 'allergy' in grouped_by_type,
+        "has_medications": 'medication' in grouped_by_type,
+        "entry_types_present": list(grouped_by_type.keys())
+    }
 
 
+@db_tool
 async def add_medical_history_entry_tool(
     patient_id: str, 
     entry_type: str, 
@@ -1845,50 +2055,117 @@ async def add_medical_history_entry_tool(
     severity: Optional[str] = None
 ) -> Dict[str, Any]:
     """Add new medical history entry"""
-    if not supabase:
-        return {"error": "Database not configured"}
+    logger.debug("📝 Adding medical history entry for %s", patient_id)
+    logger.debug("Type: %s", entry_type)
+    logger.debug("Title: %s", title)
+    
+    # Create entry; the patient_id foreign key rejects unknown patients, so there's no separate
+    # existence check. The (usually cached) name for the reply is looked up alongside.
+    entry_data = _medical_history_row(patient_id, entry_type, title, description, severity)
     
     try:
-        print(f"\n📝 Adding medical history entry for {patient_id}")
-        print(f"   Type: {entry_type}")
-        print(f"   Title: {title}")
-        
-        # Verify patient exists
-        patient_check = supabase.table("patients").select("name").eq("patient_id", patient_id).execute()
-        if not patient_check.data:
+        result, patient = await asyncio.gather(
+            _execute(supabase.table("medical_history").insert(entry_data)),
+            _get_patient(patient_id)
+        )
+    except APIError as e:
+        if e.code == FOREIGN_KEY_VIOLATION:
             return {"error": f"Patient {patient_id} not found"}
+        raise
+    
+    if result.data:
+        logger.debug("✅ Medical history entry added")
+        return _medical_history_added(result.data[0], patient['name'] if patient else patient_id)
+    
+    return {"error": "Failed to create medical history entry"}
+
+
+async def _add_medical_history_entries(tool_inputs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add several medical history entries with one patient lookup and one bulk insert. Each call is
+    validated like execute_tool would; invalid ones get their error in place and are left out of the insert.
+    """
+    validate = TOOL_VALIDATORS["add_medical_history_entry"]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(tool_inputs)
+    valid_positions = []
+    for position, tool_input in enumerate(tool_inputs):
+        invalid = validate(tool_input)
+        if invalid:
+            results[position] = {"error": invalid}
+        else:
+            valid_positions.append(position)
+    
+    if len(valid_positions) <= 1:
+        for position in valid_positions:
+            results[position] = await execute_tool("add_medical_history_entry", tool_inputs[position])
+        return results
+    
+    if not supabase:
+        return [result or {"error": "Database not configured"} for result in results]
+    
+    try:
+        logger.debug("📝 Adding %s medical history entries in one batch", len(valid_positions))
+        
+        # Verify all patients exist in one query
+        patient_ids = list({tool_inputs[position]["patient_id"] for position in valid_positions})
+        patients = await _execute(supabase.table("patients").select("patient_id, name").in_("patient_id", patient_ids))
+        names = {p["patient_id"]: p["name"] for p in (patients.data or [])}
+        
+        rows = []
+        positions = []
+        for position in valid_positions:
+            tool_input = tool_inputs[position]
+            patient_id = tool_input["patient_id"]
+            if patient_id not in names:
+                results[position] = {"error": f"Patient {patient_id} not found"}
+                continue
+            rows.append(_medical_history_row(
+                patient_id,
+                tool_input.get("entry_type", ""),
+                tool_input.get("title", ""),
+                tool_input.get("description", ""),
+                tool_input.get("severity")
+            ))
+            positions.append(position)
         
-        patient_name = patient_check.data[0]['name']
-        
-        # Create entry
-        entry_data = {
-            "patient_id": patient_id,
-            "entry_type": entry_type,
-            "title": title,
-            "description": description,
-            "provider": "Haven AI",
-            "status": "active"
-        }
-        
-        if severity:
-            entry_data["severity"] = severity
-        
-        result = supabase.table("medical_history").insert(entry_data).execute()
-        
-        if result.data:
-            print(f"   ✅ Medical history entry added")
-            
-            return {
-                "success": True,
-                "message": f"Added {entry_type} entry for {patient_name} ({patient_id})",
-                "entry_id": result.data[0]['id'],
-                "entry_type": entry_type,
-                "title": title
-            }
+        if rows:
+            # Inserted rows come back in the order they were sent
+            inserted = await _execute(supabase.table("medical_history").insert(rows))
+            for position, entry in zip(positions, inserted.data or []):
+                results[position] = _medical_history_added(entry, names[entry["patient_id"]])
+            logger.debug("✅ Added %s medical history entries", len(inserted.data or []))
         
-        return {"error": "Failed to create medical history entry"}
+        return [result or {"error": "Failed to create medical history entry"} for result in results]
     
     except Exception as e:
-        print(f"   ❌ Error adding medical history: {e}")
-        return {"error": str(e)}
+        logger.error("❌ Error adding medical history batch: %s", e)
+        return [result or {"error": str(e)} for result in results]
+
+
+def _medical_history_row(patient_id: str, entry_type: str, title: str, description: str = "", severity: Optional[str] = None) -> Dict[str, Any]:
+    """Build a medical_history row for an entry documented by the assistant"""
+    entry_data = {
+        "patient_id": patient_id,
+        "entry_type": entry_type,
+        "title": title,
+        "description": description,
+        "provider": "Haven AI",
+        "status": "active"
+    }
+    
+    if severity:
+        entry_data["severity"] = severity
+    
+    return entry_data
+
+
+def _medical_history_added(entry: Dict[str, Any], patient_name: str) -> Dict[str, Any]:
+    """Tool result for a newly inserted medical history entry"""
+    return {
+        "success": True,
+        "message": f"Added {entry['entry_type']} entry for {patient_name} ({entry['patient_id']})",
+        "entry_id": entry['id'],
+        "entry_type": entry['entry_type'],
+        "title": entry['title']
+    }
 
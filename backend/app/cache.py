@@ -4,17 +4,21 @@ Simple in-memory caching for performance optimization
 Reduces database load and improves response times
 """
 
+import asyncio
 import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any, Callable
 from threading import Lock
 
 class SimpleCache:
-    """Thread-safe cache with TTL"""
+    """Thread-safe cache with TTL, optionally bounded to max_size entries (least recently used evicted first)"""
     
-    def __init__(self, ttl_seconds: int = 10):
+    def __init__(self, ttl_seconds: int = 10, max_size: Optional[int] = None):
         self.ttl = ttl_seconds
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.max_size = max_size
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.lock = Lock()
+        self.inflight: Dict[str, asyncio.Future] = {}
     
     def get(self, key: str) -> Optional[Any]:
         """Get cached value if not expired"""
@@ -28,6 +32,7 @@ class SimpleCache:
                 del self.cache[key]
                 return None
             
+            self.cache.move_to_end(key)
             return entry['value']
     
     def set(self, key: str, value: Any):
@@ -37,6 +42,12 @@ class SimpleCache:
                 'value': value,
                 'timestamp': time.time()
             }
+            self.cache.move_to_end(key)
+            # Expired entries are only dropped when their key is read again, so keys that are
+            # never read again (e.g. superseded hashes) would pile up without a bound
+            if self.max_size is not None:
+                while len(self.cache) > self.max_size:
+                    self.cache.popitem(last=False)
     
     def invalidate(self, key: str):
         """Remove specific key from cache"""
@@ -50,14 +61,27 @@ class SimpleCache:
             self.cache.clear()
     
     async def get_or_fetch(self, key: str, fetch_func: Callable) -> Any:
-        """Get from cache or fetch and cache if not present"""
+        """
+        Get from cache or fetch and cache if not present. Callers that miss while a fetch for the
+        same key is in flight wait for it instead of fetching again; None results aren't cached.
+        """
         cached = self.get(key)
         if cached is not None:
             return cached
         
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_set(key, fetch_func))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # Shielded so one cancelled caller doesn't cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+    
+    async def _fetch_and_set(self, key: str, fetch_func: Callable) -> Any:
         # Fetch fresh data
         value = await fetch_func()
-        self.set(key, value)
+        if value is not None:
+            self.set(key, value)
         return value
 
 
@@ -66,4 +90,15 @@ patient_cache = SimpleCache(ttl_seconds=30)  # Patient data changes infrequently
 alert_cache = SimpleCache(ttl_seconds=5)     # Alerts need fresher data
 stats_cache = SimpleCache(ttl_seconds=10)    # Stats can be slightly stale
 stream_cache = SimpleCache(ttl_seconds=2)    # Streams need near real-time
+room_cache = SimpleCache(ttl_seconds=30)     # Rooms only change on floor plan sync
+insights_cache = SimpleCache(ttl_seconds=3600, max_size=1024)  # Keyed by a hash of the model's input
+history_cache = SimpleCache(ttl_seconds=3600, max_size=1024)   # Revalidated against medical_history_versions on every read
+
+# Hospital-wide stats are shared by every chat session for stats_cache's TTL
+HOSPITAL_STATS_CACHE_KEY = "hospital_stats"
+
+
+def invalidate_occupancy():
+    """Drop the cached hospital stats after a patients_room write (AI tool or REST)"""
+    stats_cache.invalidate(HOSPITAL_STATS_CACHE_KEY)
 
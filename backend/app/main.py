@@ -58,6 +58,7 @@ from app.rooms import (
     get_patient_current_room,
     sync_room_from_smplrspace,
     Floor,
+    RoomOccupiedError,
     AssignPatientRequest,
     UnassignPatientRequest
 )
@@ -74,7 +75,33 @@ except ImportError:
     anthropic_client = None
     print("⚠️  Anthropic library not installed. LLM recommendations will use keyword matching.")
 
+# The root logger stays at WARNING so libraries (httpx logs every request at INFO) stay quiet;
+# only the backend's own loggers (app.* via __name__, haven.*) follow LOG_LEVEL
+# (e.g. LOG_LEVEL=DEBUG to trace AI tool calls)
+# basicConfig is a no-op when an earlier import (e.g. fetch_handoff_agent) already configured
+# the root logger, so its level is also set explicitly. Unknown LOG_LEVEL values fall back to INFO.
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger().setLevel(logging.WARNING)
+_log_level_name = os.getenv("LOG_LEVEL", "INFO").upper()
+_log_level = logging.getLevelNamesMapping().get(_log_level_name, logging.INFO)
+for _logger_name in ("app", "haven"):
+    logging.getLogger(_logger_name).setLevel(_log_level)
 logger = logging.getLogger("haven.main")
+if _log_level_name not in logging.getLevelNamesMapping():
+    logger.warning("Unknown LOG_LEVEL %r, using INFO", _log_level_name)
+
+# Try to use orjson for response and tool-result encoding (falls back to stdlib json)
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponseClass
+
+    def dumps_json(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    from fastapi.responses import JSONResponse as DefaultResponseClass
+
+    def dumps_json(obj) -> str:
+        return json.dumps(obj)
 
 # LiveKit configuration checks
 REQUIRED_LIVEKIT_SECRETS = ["LIVEKIT_API_KEY",
@@ -108,7 +135,8 @@ def _check_livekit_config() -> tuple[bool, list[str]]:
 app = FastAPI(
     title="Haven",
     description="Real-time patient monitoring and floor plan management for clinical trials",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponseClass
 )
 
 # CORS for frontend - allows browser WebSocket connections from production and localhost
@@ -1398,6 +1426,8 @@ async def assign_patient(request: AssignPatientRequest):
             patient_id=request.patient_id,
             notes=request.notes
         )
+    except RoomOccupiedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
 
@@ -2106,7 +2136,7 @@ async def ai_chat(request: ChatRequest):
         from app.chat_context import (
             create_session, read_context, write_context, build_system_prompt
         )
-        from app.ai_tools import HAVEN_TOOLS, execute_tool
+        from app.ai_tools import HAVEN_TOOLS, execute_tools
 
         # Get or create session
         session_title = None
@@ -2243,22 +2273,28 @@ WHEN IN DOUBT: CALL A TOOL. ALWAYS PREFER TOOLS.
 
             tool_results = []
 
-            # Execute all tools in this round
+            # Collect all tool calls in this round
+            tool_uses = []
             for content_block in current_message.content:
                 if content_block.type == "text":
                     assistant_response += content_block.text
                 elif content_block.type == "tool_use":
-                    print(f"\n🔧 Tool call: {content_block.name}")
-                    print(f"   Input: {content_block.input}")
-                    tool_result = await execute_tool(content_block.name, content_block.input)
-                    print(f"   Result: {tool_result}")
-
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": content_block.id,
-                        "content": json.dumps(tool_result)
-                    })
-                    all_tool_results.append(tool_result)
+                    logger.debug("🔧 Tool call: %s input=%s", content_block.name, content_block.input)
+                    tool_uses.append(content_block)
+
+            # Execute them together so consecutive writes are batched and repeated reads run once
+            round_results = await execute_tools([(block.name, block.input) for block in tool_uses])
+
+            for content_block, tool_result in zip(tool_uses, round_results):
+                # Tool results can be large; only format them when debugging
+                logger.debug("   Result: %s", tool_result)
+
+                tool_results.append({
+                    "type": "tool_result",
+                    "tool_use_id": content_block.id,
+                    "content": dumps_json(tool_result)
+                })
+                all_tool_results.append(tool_result)
 
             # Add this round to conversation
             anthropic_messages.append({
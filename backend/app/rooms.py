@@ -6,8 +6,17 @@ Uses Supabase with normalized tables: rooms + patients_room
 
 from typing import List, Optional, Dict
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timezone
+from postgrest.exceptions import APIError
 from app.supabase_client import supabase
+from app.cache import invalidate_occupancy, room_cache
+
+# Postgres SQLSTATE for a unique violation (patients_room allows one patient per room and one room per patient)
+UNIQUE_VIOLATION = "23505"
+
+
+class RoomOccupiedError(ValueError):
+    """The assignment lost to another one for the same room (or patient) made at the same time"""
 
 class Floor(BaseModel):
     floor_id: str
@@ -93,9 +102,10 @@ def get_all_rooms_with_patients(floor_id: str = None) -> List[RoomWithPatient]:
                 query = query.eq("floor_id", floor_id)
             rooms_response = query.execute()
             
-            # Get all current assignments with patient info
-            assignments_response = supabase.table("patients_room") \
-                .select("room_id, patient_id, assigned_at, patients(name)") \
+            # Get all current assignments with patient info (pre-joined view, no per-row embed)
+            assignments_response = supabase.table("patient_room_view") \
+                .select("room_id, patient_id, assigned_at, name") \
+                .not_.is_("room_id", "null") \
                 .execute()
             
             # Create a map of room_id -> patient assignment
@@ -103,7 +113,7 @@ def get_all_rooms_with_patients(floor_id: str = None) -> List[RoomWithPatient]:
             for assignment in assignments_response.data:
                 assignment_map[assignment['room_id']] = {
                     'patient_id': assignment['patient_id'],
-                    'patient_name': assignment['patients']['name'] if assignment.get('patients') else None,
+                    'patient_name': assignment.get('name'),
                     'assigned_at': assignment.get('assigned_at')
                 }
             
@@ -146,8 +156,8 @@ def assign_patient_to_room(room_id: str, patient_id: str, notes: Optional[str] =
     Assign a patient to a room
     
     DATABASE REFERENCE: public.patients_room
-    - Inserts new patient-room assignment
-    - Enforces UNIQUE constraint on (room_id, patient_id)
+    - Inserts new patient-room assignment (or moves the patient's existing one)
+    - UNIQUE indexes on room_id and patient_id; an occupied room raises RoomOccupiedError
     - Returns the assignment record
     """
     if supabase:
@@ -168,34 +178,58 @@ def assign_patient_to_room(room_id: str, patient_id: str, notes: Optional[str] =
                 print(f"⚠️ Patient {patient_id} already assigned to {room_id}")
                 return PatientRoomAssignment(**existing.data[0])
             
+            # Refuse an occupied room before touching the patient's current assignment
+            occupant = supabase.table("patients_room") \
+                .select("patient_id") \
+                .eq("room_id", room_id) \
+                .execute()
+            
+            if occupant.data:
+                raise RoomOccupiedError(f"Room {room_id} is already occupied")
+            
             # Check if patient is assigned to another room (optional, depending on business logic)
             patient_rooms = supabase.table("patients_room") \
                 .select("room_id") \
                 .eq("patient_id", patient_id) \
                 .execute()
             
-            if patient_rooms.data:
-                # Patient already in another room - unassign first
-                old_room = patient_rooms.data[0]['room_id']
-                print(f"⚠️ Patient {patient_id} was in {old_room}, removing...")
-                supabase.table("patients_room") \
-                    .delete() \
-                    .eq("patient_id", patient_id) \
-                    .execute()
+            assignment = {
+                "room_id": room_id,
+                "patient_id": patient_id,
+                "notes": notes,
+                "assigned_by": assigned_by
+            }
             
-            # Insert new assignment
-            response = supabase.table("patients_room") \
-                .insert({
-                    "room_id": room_id,
-                    "patient_id": patient_id,
-                    "notes": notes,
-                    "assigned_by": assigned_by
-                }) \
-                .execute()
+            # The unique indexes on room_id and patient_id reject an assignment that raced this one
+            try:
+                if patient_rooms.data:
+                    # Patient already in another room - move the row in one statement, so a
+                    # conflict leaves the old assignment in place instead of unassigning the patient
+                    old_room = patient_rooms.data[0]['room_id']
+                    print(f"⚠️ Patient {patient_id} was in {old_room}, moving...")
+                    response = supabase.table("patients_room") \
+                        .update({**assignment, "assigned_at": datetime.now(timezone.utc).isoformat()}) \
+                        .eq("patient_id", patient_id) \
+                        .execute()
+                else:
+                    response = supabase.table("patients_room") \
+                        .insert(assignment) \
+                        .execute()
+            except APIError as e:
+                if e.code != UNIQUE_VIOLATION:
+                    raise
+                # Postgres names the conflicting column in the details: "Key (room_id)=(...) already exists."
+                if "(room_id)" in (e.details or ""):
+                    raise RoomOccupiedError(f"Room {room_id} is already occupied")
+                raise RoomOccupiedError(f"Patient {patient_id} was just assigned to another room")
             
+            # AI tools cache hospital stats; make them see the new assignment
+            invalidate_occupancy()
             print(f"✅ Assigned {patient_id} to {room_id}")
             return PatientRoomAssignment(**response.data[0])
             
+        except RoomOccupiedError:
+            raise
         except Exception as e:
             print(f"⚠️ Supabase error: {e}")
             raise ValueError(f"Failed to assign patient: {e}")
@@ -220,6 +254,7 @@ def unassign_patient_from_room(room_id: str, patient_id: Optional[str] = None) -
                 query = query.eq("patient_id", patient_id)
             
             response = query.execute()
+            invalidate_occupancy()
             
             print(f"✅ Removed patient(s) from {room_id}")
             return {"success": True, "message": f"Patient removed from {room_id}"}
@@ -291,6 +326,9 @@ def sync_room_from_smplrspace(room_data: Dict, floor_id: str = 'floor-1') -> Roo
             }, on_conflict='room_id') \
             .execute()
         
+        # AI tools cache the rooms table; make them see the synced room
+        room_cache.clear()
+        
         print(f"✅ Synced room {room_id} to floor {floor_id}")
         return Room(**response.data[0])
         
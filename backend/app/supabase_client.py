@@ -6,7 +6,8 @@ Reads from environment variables (Infisical CLI or Render dashboard)
 import inspect
 import os
 
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
 from supabase._sync.client import (
     DEFAULT_POSTGREST_CLIENT_TIMEOUT,
     SyncClient,
@@ -14,6 +15,7 @@ from supabase._sync.client import (
 
 try:
     from postgrest._sync.client import SyncPostgrestClient
+    from postgrest.utils import SyncClient as PostgrestSession
 except ImportError:
     SyncPostgrestClient = None  # type: ignore
 
@@ -23,6 +25,37 @@ except ImportError:
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 
+# Connection pool for PostgREST traffic. Every module imports the same `supabase`
+# singleton below, so all queries share these keep-alive TCP/TLS connections
+# instead of paying a handshake per request.
+POSTGREST_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+
+def _pooled_transport(verify: bool = True) -> httpx.HTTPTransport:
+    """HTTP/2 transport on the shared pool limits that retries failed connection attempts"""
+    # retries only covers connecting (ConnectError/ConnectTimeout), so a request is never sent twice
+    return httpx.HTTPTransport(verify=verify, http2=True, limits=POSTGREST_POOL_LIMITS, retries=2)
+
+
+# Seconds each phase of a PostgREST request (connect, pool wait, send, each read)
+# may take. Far below supabase's 120s default, so a hung connection fails fast
+# (reads are then retried by ai_tools._execute) instead of stalling a chat turn
+# for two minutes. Applied on both client paths below: postgrest releases without
+# `http_client` get it through postgrest_client_timeout, newer ones use the shared
+# client and its timeout.
+POSTGREST_CLIENT_TIMEOUT = 10
+
+# One HTTP/2 keep-alive client handed to supabase for its auth, storage and
+# functions clients (and PostgREST, on postgrest releases that accept it), so
+# they reuse warm connections instead of each opening their own. Its timeout is
+# per phase, not per request, so large storage uploads still complete as long
+# as each write makes progress.
+SHARED_HTTP_CLIENT = httpx.Client(
+    timeout=httpx.Timeout(POSTGREST_CLIENT_TIMEOUT),
+    follow_redirects=True,
+    transport=_pooled_transport(),
+)
+
 # Temporary compatibility shim:
 # Supabase >= 2.22 expects the postgrest client to accept an `http_client` kwarg.
 # Older postgrest releases (<0.19) do not support this argument which results in
@@ -35,6 +68,20 @@ if SyncPostgrestClient is not None:
     ).parameters
 
     if "http_client" not in postgrest_init_params:
+        class _PooledPostgrestClient(SyncPostgrestClient):
+            """PostgREST client whose session uses the shared pool limits"""
+
+            def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+                return PostgrestSession(
+                    base_url=base_url,
+                    headers=headers,
+                    timeout=timeout,
+                    verify=verify,
+                    proxy=proxy,
+                    follow_redirects=True,
+                    transport=_pooled_transport(verify),
+                )
+
         def _compat_init_postgrest_client(  # type: ignore[override]
             rest_url: str,
             headers: dict[str, str],
@@ -44,11 +91,8 @@ if SyncPostgrestClient is not None:
             proxy: str | None = None,
             http_client=None,
         ) -> SyncPostgrestClient:
-            if http_client is not None:
-                print(
-                    "⚠️  postgrest client does not support custom http_client; ignoring provided instance."
-                )
-
+            # This postgrest release cannot take `http_client`; the pooled session
+            # below applies the same pool limits to its own connections instead.
             kwargs: dict[str, object] = {}
             if "timeout" in postgrest_init_params:
                 kwargs["timeout"] = timeout
@@ -57,7 +101,7 @@ if SyncPostgrestClient is not None:
             if "proxy" in postgrest_init_params:
                 kwargs["proxy"] = proxy
 
-            return SyncPostgrestClient(
+            return _PooledPostgrestClient(
                 rest_url,
                 headers=headers,
                 schema=schema,
@@ -78,7 +122,14 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     supabase: Client | None = None
 else:
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+        supabase: Client = create_client(
+            SUPABASE_URL,
+            SUPABASE_ANON_KEY,
+            options=ClientOptions(
+                httpx_client=SHARED_HTTP_CLIENT,
+                postgrest_client_timeout=POSTGREST_CLIENT_TIMEOUT,
+            ),
+        )
         print(f"✅ Supabase configured: {SUPABASE_URL[:30]}...")
     except Exception as e:
         print(f"⚠️ Failed to initialize Supabase client: {e}")
@@ -0,0 +1,25 @@
+-- Migration: Denormalized patient/room view for the Haven AI tools
+-- Joins patients -> patients_room -> rooms once in Postgres so the AI tools
+-- no longer stitch the three tables together client-side.
+-- Run this in your Supabase SQL editor
+
+-- This is a plain view rather than a materialized one: assignments change on
+-- every admit/transfer and the AI tools must always see current occupancy, so
+-- Postgres expands it into the indexed base tables at query time instead of
+-- refreshing a copy from triggers.
+CREATE OR REPLACE VIEW patient_room_view
+WITH (security_invoker = true) AS
+SELECT
+    p.*,
+    pr.room_id,
+    r.room_name,
+    r.room_type,
+    pr.assigned_at
+FROM patients p
+LEFT JOIN patients_room pr ON pr.patient_id = p.patient_id
+LEFT JOIN rooms r ON r.room_id = pr.room_id;
+
+-- Indexes backing the joins and the common filters on the view
+CREATE INDEX IF NOT EXISTS idx_patients_room_patient_id ON patients_room(patient_id);
+CREATE INDEX IF NOT EXISTS idx_patients_room_room_id ON patients_room(room_id);
+CREATE INDEX IF NOT EXISTS idx_patients_enrollment_status ON patients(enrollment_status);
@@ -0,0 +1,16 @@
+-- Migration: Available patient rooms view
+-- Computes "patient rooms with no assignment" in Postgres with an anti-join so
+-- only the free rooms are sent to the backend.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE VIEW available_rooms
+WITH (security_invoker = true) AS
+SELECT r.*
+FROM rooms r
+WHERE r.room_type = 'patient'
+  AND NOT EXISTS (
+      SELECT 1 FROM patients_room pr WHERE pr.room_id = r.room_id
+  );
+
+-- The anti-join probes patients_room by room_id (also created in 005)
+CREATE INDEX IF NOT EXISTS idx_patients_room_room_id ON patients_room(room_id);
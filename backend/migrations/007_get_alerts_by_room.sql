@@ -0,0 +1,16 @@
+-- Migration: Group active alerts by room and severity in Postgres
+-- Used by the get_alerts_by_room AI tool via supabase.rpc("get_alerts_by_room")
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION get_alerts_by_room()
+RETURNS TABLE(room_id TEXT, severity TEXT, cnt INT, alerts JSONB) AS $$
+    SELECT
+        a.room_id::TEXT,
+        a.severity::TEXT,
+        COUNT(*)::INT,
+        jsonb_agg(to_jsonb(a) ORDER BY a.triggered_at DESC)
+    FROM alerts a
+    WHERE a.status = 'active'
+      AND a.room_id IS NOT NULL
+    GROUP BY a.room_id, a.severity;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,41 @@
+-- Migration: Composite indexes for the AI tools' hot filter + order patterns
+-- Each index matches an exact WHERE ... ORDER BY shape used in app/ai_tools.py
+-- so Postgres can walk the index instead of scanning and sorting the table.
+-- Run this in your Supabase SQL editor
+
+-- medical_history: per-patient timeline (get_patient_details,
+-- generate_patient_clinical_summary) and the entry_type-filtered variant
+-- (get_patient_medical_history)
+CREATE INDEX IF NOT EXISTS idx_medical_history_patient_date
+    ON medical_history(patient_id, entry_date DESC);
+CREATE INDEX IF NOT EXISTS idx_medical_history_patient_type_date
+    ON medical_history(patient_id, entry_type, entry_date DESC);
+
+-- alerts: only active alerts are ever looked up by patient or room, so keep
+-- the indexes partial and small
+CREATE INDEX IF NOT EXISTS idx_alerts_active_patient
+    ON alerts(patient_id) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_alerts_active_room
+    ON alerts(room_id, severity) WHERE status = 'active';
+
+-- vital_signs: latest reading per patient
+CREATE INDEX IF NOT EXISTS idx_vital_signs_patient_recorded
+    ON vital_signs(patient_id, recorded_at DESC);
+
+-- patients_room: a patient occupies at most one room. Enforce it with a
+-- unique index, which also replaces the plain index from 005. Duplicate
+-- assignments left by the old unassign-then-insert flow would make the index
+-- build fail, so keep only each patient's most recent one first.
+DELETE FROM patients_room
+WHERE ctid IN (
+    SELECT ctid FROM (
+        SELECT ctid, ROW_NUMBER() OVER (
+            PARTITION BY patient_id ORDER BY assigned_at DESC NULLS LAST, ctid DESC
+        ) AS rn
+        FROM patients_room
+    ) ranked
+    WHERE rn > 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_room_patient_id_unique
+    ON patients_room(patient_id);
+DROP INDEX IF EXISTS idx_patients_room_patient_id;
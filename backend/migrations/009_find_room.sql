@@ -0,0 +1,32 @@
+-- Migration: Server-side room name matching for the AI tools
+-- Used by get_room_status via supabase.rpc("find_room", {"query": ...}) so the
+-- match runs next to the data and only the winning row is returned.
+-- Run this in your Supabase SQL editor
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Trigram index serves both the ILIKE partial match and similarity()
+CREATE INDEX IF NOT EXISTS idx_rooms_name_trgm ON rooms USING gin (room_name gin_trgm_ops);
+
+-- Same priority as fuzzy_match_room in app/ai_tools.py:
+--   1. exact name/ID match (case-insensitive)
+--   2. same room number ("5" -> "Room 5", never "Room 25")
+--   3. partial name/ID match
+--   4. closest trigram similarity above 0.3
+CREATE OR REPLACE FUNCTION find_room(query TEXT)
+RETURNS SETOF rooms AS $$
+    SELECT r.*
+    FROM rooms r
+    WHERE lower(r.room_name) = lower(trim(query))
+       OR lower(r.room_id::TEXT) = lower(trim(query))
+       OR substring(r.room_name FROM '\d+') = substring(query FROM '\d+')
+       OR r.room_name ILIKE '%' || trim(query) || '%'
+       OR r.room_id::TEXT ILIKE '%' || trim(query) || '%'
+       OR similarity(r.room_name, query) > 0.3
+    ORDER BY
+        (lower(r.room_name) = lower(trim(query)) OR lower(r.room_id::TEXT) = lower(trim(query))) DESC,
+        (substring(r.room_name FROM '\d+') = substring(query FROM '\d+')) IS TRUE DESC,
+        (r.room_name ILIKE '%' || trim(query) || '%' OR r.room_id::TEXT ILIKE '%' || trim(query) || '%') DESC,
+        similarity(r.room_name, query) DESC
+    LIMIT 1;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,62 @@
+-- Migration: Compose the full patient bundle for get_patient_details in Postgres
+-- Used by the get_patient_details AI tool via supabase.rpc("get_patient_bundle", {"pid": ...})
+-- Returns the patient row merged with room, active alerts, latest vitals and the
+-- allergy / medication / diagnosis slices of medical_history, or NULL if the
+-- patient does not exist.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION get_patient_bundle(pid TEXT)
+RETURNS JSONB AS $$
+    SELECT to_jsonb(p) || jsonb_build_object(
+        'current_room', (
+            SELECT jsonb_build_object('room_name', r.room_name, 'room_type', r.room_type)
+            FROM patients_room pr
+            JOIN rooms r ON r.room_id = pr.room_id
+            WHERE pr.patient_id = p.patient_id
+            LIMIT 1
+        ),
+        'assigned_at', (
+            SELECT pr.assigned_at
+            FROM patients_room pr
+            WHERE pr.patient_id = p.patient_id
+            LIMIT 1
+        ),
+        'active_alerts', COALESCE((
+            SELECT jsonb_agg(to_jsonb(a) ORDER BY a.triggered_at DESC)
+            FROM (
+                SELECT id, alert_type, severity, patient_id, room_id, title, description, status, triggered_at
+                FROM alerts
+                WHERE patient_id = p.patient_id AND status = 'active'
+            ) a
+        ), '[]'::JSONB),
+        'latest_vitals', (
+            SELECT to_jsonb(v)
+            FROM vital_signs v
+            WHERE v.patient_id = p.patient_id
+            ORDER BY v.recorded_at DESC
+            LIMIT 1
+        ),
+        'allergies', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('title', m.title, 'description', m.description, 'metadata', m.metadata) ORDER BY m.entry_date DESC)
+            FROM medical_history m
+            WHERE m.patient_id = p.patient_id AND m.entry_type = 'allergy' AND m.status = 'active'
+        ), '[]'::JSONB),
+        'current_medications', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('title', m.title, 'description', m.description, 'metadata', m.metadata) ORDER BY m.entry_date DESC)
+            FROM medical_history m
+            WHERE m.patient_id = p.patient_id AND m.entry_type = 'medication' AND m.status = 'active'
+        ), '[]'::JSONB),
+        'diagnoses', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('title', d.title, 'description', d.description, 'entry_date', d.entry_date) ORDER BY d.entry_date DESC)
+            FROM (
+                SELECT title, description, entry_date
+                FROM medical_history
+                WHERE patient_id = p.patient_id AND entry_type = 'diagnosis'
+                ORDER BY entry_date DESC
+                LIMIT 3
+            ) d
+        ), '[]'::JSONB)
+    )
+    FROM patients p
+    WHERE p.patient_id = pid;
+$$ LANGUAGE sql STABLE;
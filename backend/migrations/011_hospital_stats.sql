@@ -0,0 +1,21 @@
+-- Migration: Hospital-wide counts in a single call
+-- Used by the get_hospital_stats AI tool via supabase.rpc("hospital_stats")
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION hospital_stats()
+RETURNS JSON AS $$
+    SELECT json_build_object(
+        'total_patients', (SELECT COUNT(*) FROM patients WHERE enrollment_status = 'active'),
+        'total_rooms', (SELECT COUNT(*) FROM rooms WHERE room_type = 'patient'),
+        'occupied_rooms', (SELECT COUNT(*) FROM patients_room),
+        'alerts', COALESCE((
+            SELECT json_object_agg(severity, cnt)
+            FROM (
+                SELECT COALESCE(severity::TEXT, 'unknown') AS severity, COUNT(*) AS cnt
+                FROM alerts
+                WHERE status = 'active'
+                GROUP BY 1
+            ) t
+        ), '{}'::JSON)
+    );
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,28 @@
+-- Migration: Atomic patient transfer
+-- Used by the transfer_patient AI tool via supabase.rpc("transfer_patient", {...})
+-- Moves the patient's existing assignment with one UPDATE instead of a
+-- DELETE + INSERT pair, so there is no window where the patient has no room.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION transfer_patient(pid TEXT, new_room TEXT)
+RETURNS JSON AS $$
+DECLARE
+  moved patients_room%ROWTYPE;
+BEGIN
+  -- Only move into an empty room; returns NULL if the patient has no
+  -- assignment or the destination was taken in the meantime
+  UPDATE patients_room
+  SET room_id = new_room,
+      assigned_by = 'Haven AI',
+      assigned_at = NOW()
+  WHERE patient_id = pid
+    AND NOT EXISTS (SELECT 1 FROM patients_room WHERE room_id = new_room)
+  RETURNING * INTO moved;
+  
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+  
+  RETURN row_to_json(moved);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,35 @@
+-- Migration: Race-safe patient transfer
+-- Replaces transfer_patient from 012 so the destination check, the move and
+-- the fallback insert all happen in one transaction that concurrent
+-- transfers into the same room cannot interleave with.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION transfer_patient(pid TEXT, new_room TEXT)
+RETURNS JSON AS $$
+DECLARE
+  moved patients_room%ROWTYPE;
+BEGIN
+  -- Serialize transfers into the same room for the rest of this transaction
+  PERFORM pg_advisory_xact_lock(hashtext('patients_room:' || new_room));
+  
+  IF EXISTS (SELECT 1 FROM patients_room WHERE room_id = new_room AND patient_id <> pid) THEN
+    RETURN json_build_object('error', 'occupied');
+  END IF;
+  
+  UPDATE patients_room
+  SET room_id = new_room,
+      assigned_by = 'Haven AI',
+      assigned_at = NOW()
+  WHERE patient_id = pid
+  RETURNING * INTO moved;
+  
+  -- Assignment vanished since the caller looked it up: place the patient anyway
+  IF NOT FOUND THEN
+    INSERT INTO patients_room (patient_id, room_id, assigned_by)
+    VALUES (pid, new_room, 'Haven AI')
+    RETURNING * INTO moved;
+  END IF;
+  
+  RETURN row_to_json(moved);
+END;
+$$ LANGUAGE plpgsql;
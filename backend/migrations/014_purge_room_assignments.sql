@@ -0,0 +1,13 @@
+-- Migration: Clear every room assignment in one statement
+-- Used by the remove_all_patients_from_rooms AI tool via supabase.rpc("purge_room_assignments")
+-- Returns how many assignments were removed.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION purge_room_assignments()
+RETURNS INT AS $$
+    WITH removed AS (
+        DELETE FROM patients_room
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INT FROM removed;
+$$ LANGUAGE sql;
@@ -0,0 +1,39 @@
+-- Migration: Per-room active alert summary
+-- Used by the get_alerts_by_room AI tool via supabase.table("room_alert_summary")
+-- Run this in your Supabase SQL editor
+
+-- Like patient_room_view this is a plain view rather than a materialized one:
+-- alerts are inserted continuously by the monitors, and REFRESH MATERIALIZED
+-- VIEW CONCURRENTLY cannot run inside the trigger that would have to fire on
+-- every insert. Postgres computes the summary from the partial index on
+-- active alerts at query time, so the tool still reads one pre-ranked row
+-- per room.
+CREATE OR REPLACE VIEW room_alert_summary
+WITH (security_invoker = true) AS
+WITH ranked AS (
+    SELECT
+        a.*,
+        CASE a.severity::TEXT
+            WHEN 'critical' THEN 4
+            WHEN 'high' THEN 3
+            WHEN 'medium' THEN 2
+            WHEN 'low' THEN 1
+            ELSE 0
+        END AS severity_rank
+    FROM alerts a
+    WHERE a.status = 'active'
+      AND a.room_id IS NOT NULL
+)
+SELECT
+    ranked.room_id::TEXT AS room_id,
+    COALESCE(r.room_name, ranked.room_id::TEXT) AS room_name,
+    COUNT(*)::INT AS alert_count,
+    MAX(ranked.severity_rank) AS severity_rank,
+    (ARRAY_AGG(ranked.severity::TEXT ORDER BY ranked.severity_rank DESC))[1] AS highest_severity,
+    jsonb_agg(to_jsonb(ranked) - 'severity_rank' ORDER BY ranked.severity_rank DESC, ranked.triggered_at DESC) AS alerts
+FROM ranked
+LEFT JOIN rooms r ON r.room_id = ranked.room_id
+GROUP BY ranked.room_id, r.room_name;
+
+-- The view replaces the get_alerts_by_room() RPC from 007, which nothing calls anymore
+DROP FUNCTION IF EXISTS get_alerts_by_room();
@@ -0,0 +1,31 @@
+-- Migration: Group a patient's recent medical history by entry type in Postgres
+-- Used by the get_patient_medical_history and generate_patient_clinical_summary AI tools via
+-- supabase.rpc("get_patient_history_grouped", {"pid": ..., "entry_kind": ..., "lim": ...})
+-- Returns {"total": n, "by_type": {"<entry_type>": [entries, newest first], ...}} for the
+-- patient's `lim` most recent entries (optionally of one entry type).
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION get_patient_history_grouped(pid TEXT, entry_kind TEXT DEFAULT NULL, lim INT DEFAULT 20)
+RETURNS JSONB AS $$
+    WITH recent AS (
+        SELECT *
+        FROM medical_history
+        WHERE patient_id = pid
+          AND (entry_kind IS NULL OR entry_type = entry_kind)
+        ORDER BY entry_date DESC
+        LIMIT lim
+    )
+    SELECT jsonb_build_object(
+        'total', (SELECT COUNT(*) FROM recent),
+        'by_type', COALESCE((
+            SELECT jsonb_object_agg(t.entry_type, t.entries)
+            FROM (
+                SELECT
+                    COALESCE(r.entry_type::TEXT, 'other') AS entry_type,
+                    jsonb_agg(to_jsonb(r) ORDER BY r.entry_date DESC) AS entries
+                FROM recent r
+                GROUP BY 1
+            ) t
+        ), '{}'::JSONB)
+    );
+$$ LANGUAGE sql STABLE;
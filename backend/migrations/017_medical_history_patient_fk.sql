@@ -0,0 +1,21 @@
+-- Migration: Enforce medical_history.patient_id -> patients
+-- add_medical_history_entry inserts first and reports "patient not found" from the
+-- foreign key violation (SQLSTATE 23503) instead of checking the patient beforehand.
+-- Run this in your Supabase SQL editor
+
+-- NOT VALID enforces the constraint for new rows without scanning (or failing on)
+-- rows written before it existed. Run VALIDATE CONSTRAINT later once any orphans
+-- have been cleaned up.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'fk_medical_history_patient'
+    ) THEN
+        ALTER TABLE medical_history
+            ADD CONSTRAINT fk_medical_history_patient
+            FOREIGN KEY (patient_id) REFERENCES patients(patient_id)
+            ON DELETE CASCADE
+            NOT VALID;
+    END IF;
+END
+$$;
@@ -0,0 +1,33 @@
+-- Migration: A patient's active alerts and recent alert history in one call
+-- Used by the generate_patient_clinical_summary AI tool via
+-- supabase.rpc("get_patient_alerts", {"pid": ..., "history_limit": ...})
+-- Returns {"active": [every active alert, newest first], "recent": [last N alerts of any status]}
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION get_patient_alerts(pid TEXT, history_limit INT DEFAULT 20)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'active', COALESCE((
+            SELECT jsonb_agg(to_jsonb(a) ORDER BY a.triggered_at DESC)
+            FROM (
+                SELECT id, alert_type, severity, patient_id, room_id, title, description, status, triggered_at
+                FROM alerts
+                WHERE patient_id = pid AND status = 'active'
+            ) a
+        ), '[]'::JSONB),
+        'recent', COALESCE((
+            SELECT jsonb_agg(to_jsonb(h) ORDER BY h.triggered_at DESC)
+            FROM (
+                SELECT id, severity, title, triggered_at
+                FROM alerts
+                WHERE patient_id = pid
+                ORDER BY triggered_at DESC
+                LIMIT history_limit
+            ) h
+        ), '[]'::JSONB)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- The history half walks alerts by patient newest-first
+CREATE INDEX IF NOT EXISTS idx_alerts_patient_triggered
+    ON alerts(patient_id, triggered_at DESC);
@@ -0,0 +1,64 @@
+-- Migration: Pair unassigned patients with free rooms in one statement
+-- Used by the auto_assign_patients_to_rooms AI tool via
+-- supabase.rpc("auto_assign_patients", {"max_count": ...})
+-- Returns {"assignments": [{patient_id, patient_name, room_id, room_name}, ...],
+--          "unassigned_count": n, "available_count": m} where the counts are
+-- taken before anything is assigned.
+-- Run this in your Supabase SQL editor
+
+CREATE OR REPLACE FUNCTION auto_assign_patients(max_count INT DEFAULT NULL)
+RETURNS JSONB AS $$
+DECLARE
+  unassigned_count INT;
+  available_count INT;
+  assigned JSONB;
+BEGIN
+  -- One auto-assign at a time, so concurrent callers can't hand out the same rooms
+  PERFORM pg_advisory_xact_lock(hashtext('auto_assign_patients'));
+  
+  SELECT COUNT(*) INTO unassigned_count
+  FROM patients p
+  WHERE p.enrollment_status = 'active'
+    AND NOT EXISTS (SELECT 1 FROM patients_room pr WHERE pr.patient_id = p.patient_id);
+  
+  SELECT COUNT(*) INTO available_count FROM available_rooms;
+  
+  WITH waiting AS (
+    SELECT p.patient_id, p.name, row_number() OVER (ORDER BY p.patient_id) AS rn
+    FROM patients p
+    WHERE p.enrollment_status = 'active'
+      AND NOT EXISTS (SELECT 1 FROM patients_room pr WHERE pr.patient_id = p.patient_id)
+  ),
+  free AS (
+    SELECT r.room_id, r.room_name, row_number() OVER (ORDER BY r.room_name) AS rn
+    FROM available_rooms r
+  ),
+  pairs AS (
+    SELECT w.patient_id, w.name, f.room_id, f.room_name, w.rn
+    FROM waiting w
+    JOIN free f USING (rn)
+    WHERE max_count IS NULL OR w.rn <= max_count
+  ),
+  inserted AS (
+    INSERT INTO patients_room (patient_id, room_id, assigned_by)
+    SELECT patient_id, room_id, 'Haven AI Auto-Assign' FROM pairs
+    ON CONFLICT DO NOTHING
+    RETURNING patient_id
+  )
+  SELECT COALESCE(jsonb_agg(jsonb_build_object(
+           'patient_id', pairs.patient_id,
+           'patient_name', pairs.name,
+           'room_id', pairs.room_id,
+           'room_name', pairs.room_name
+         ) ORDER BY pairs.rn), '[]'::JSONB)
+  INTO assigned
+  FROM inserted
+  JOIN pairs ON pairs.patient_id = inserted.patient_id;
+  
+  RETURN jsonb_build_object(
+    'assignments', assigned,
+    'unassigned_count', unassigned_count,
+    'available_count', available_count
+  );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,89 @@
+-- Migration: Version each patient's medical history so unchanged reads can be skipped
+-- A trigger bumps medical_history_versions.version whenever a patient's history changes.
+-- get_patient_history_grouped now returns that version, and when called with the version
+-- the caller already holds (known_version) it returns {"version": v, "unchanged": true}
+-- instead of re-aggregating the entries. Used by the AI tools' history cache via
+-- supabase.rpc("get_patient_history_grouped", {"pid": ..., "entry_kind": ..., "lim": ..., "known_version": ...})
+-- Run this in your Supabase SQL editor
+
+CREATE TABLE IF NOT EXISTS medical_history_versions (
+    patient_id TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backfill patients whose history predates the trigger, so every patient with entries has a version
+INSERT INTO medical_history_versions (patient_id)
+SELECT DISTINCT patient_id FROM medical_history
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_medical_history_version()
+RETURNS TRIGGER AS $$
+DECLARE
+  changed_patient TEXT;
+BEGIN
+  FOREACH changed_patient IN ARRAY ARRAY[
+    CASE WHEN TG_OP <> 'DELETE' THEN NEW.patient_id END,
+    CASE WHEN TG_OP <> 'INSERT' THEN OLD.patient_id END
+  ] LOOP
+    CONTINUE WHEN changed_patient IS NULL;
+    INSERT INTO medical_history_versions (patient_id)
+    VALUES (changed_patient)
+    ON CONFLICT (patient_id) DO UPDATE
+      SET version = medical_history_versions.version + 1,
+          updated_at = NOW();
+  END LOOP;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_medical_history_version ON medical_history;
+
+CREATE TRIGGER trigger_medical_history_version
+  AFTER INSERT OR UPDATE OR DELETE ON medical_history
+  FOR EACH ROW
+  EXECUTE FUNCTION bump_medical_history_version();
+
+-- Replaces the three-argument version from 016 (an overload would make calls ambiguous)
+DROP FUNCTION IF EXISTS get_patient_history_grouped(TEXT, TEXT, INT);
+
+CREATE OR REPLACE FUNCTION get_patient_history_grouped(
+    pid TEXT,
+    entry_kind TEXT DEFAULT NULL,
+    lim INT DEFAULT 20,
+    known_version BIGINT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+    WITH current_version AS (
+        SELECT (SELECT version FROM medical_history_versions WHERE patient_id = pid) AS version
+    ),
+    recent AS (
+        SELECT *
+        FROM medical_history
+        WHERE patient_id = pid
+          AND (entry_kind IS NULL OR entry_type = entry_kind)
+          AND (known_version IS NULL OR known_version IS DISTINCT FROM (SELECT version FROM current_version))
+        ORDER BY entry_date DESC
+        LIMIT lim
+    )
+    SELECT CASE
+        WHEN known_version IS NOT NULL AND known_version = v.version
+            THEN jsonb_build_object('version', v.version, 'unchanged', TRUE)
+        ELSE jsonb_build_object(
+            'version', v.version,
+            'total', (SELECT COUNT(*) FROM recent),
+            'by_type', COALESCE((
+                SELECT jsonb_object_agg(t.entry_type, t.entries)
+                FROM (
+                    SELECT
+                        COALESCE(r.entry_type::TEXT, 'other') AS entry_type,
+                        jsonb_agg(to_jsonb(r) ORDER BY r.entry_date DESC) AS entries
+                    FROM recent r
+                    GROUP BY 1
+                ) t
+            ), '{}'::JSONB)
+        )
+    END
+    FROM current_version v;
+$$ LANGUAGE sql STABLE;
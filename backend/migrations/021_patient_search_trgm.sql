@@ -0,0 +1,14 @@
+-- Migration: Trigram indexes for the AI tools' substring patient searches
+-- search_patients filters on patient_id/name ILIKE '%q%' and get_patients_by_condition
+-- on condition ILIKE '%q%'. A leading wildcard can't use a btree, so these scanned the
+-- whole patients table; pg_trgm GIN indexes serve ILIKE directly (no lower() rewrite needed).
+-- Run this in your Supabase SQL editor
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_patients_name_trgm
+    ON patients USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_patient_id_trgm
+    ON patients USING gin (patient_id gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_condition_trgm
+    ON patients USING gin (condition gin_trgm_ops);
@@ -0,0 +1,56 @@
+-- Migration: Race-safe single-call patient assignment
+-- Used by the assign_patient_to_room AI tool via
+-- supabase.rpc("assign_patient_room", {"pid": ..., "target_room": ...})
+-- Returns {"patient_id", "patient_name", "room_id"} on success, or
+-- {"error": "patient_not_found" | "occupied" | "already_assigned"}.
+-- Run this in your Supabase SQL editor
+
+-- A room holds at most one patient. Enforce it with a unique index, which also
+-- replaces the plain index from 005 (the patient_id side was made unique in 008).
+-- Rooms that already hold several patients would make the index build fail, so
+-- keep only each room's most recent assignment first.
+DELETE FROM patients_room
+WHERE ctid IN (
+    SELECT ctid FROM (
+        SELECT ctid, ROW_NUMBER() OVER (
+            PARTITION BY room_id ORDER BY assigned_at DESC NULLS LAST, ctid DESC
+        ) AS rn
+        FROM patients_room
+    ) ranked
+    WHERE rn > 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_room_room_id_unique
+    ON patients_room(room_id);
+DROP INDEX IF EXISTS idx_patients_room_room_id;
+
+CREATE OR REPLACE FUNCTION assign_patient_room(pid TEXT, target_room TEXT)
+RETURNS JSON AS $$
+DECLARE
+  patient_name TEXT;
+  assigned patients_room%ROWTYPE;
+BEGIN
+  SELECT name INTO patient_name FROM patients WHERE patient_id = pid;
+  IF NOT FOUND THEN
+    RETURN json_build_object('error', 'patient_not_found');
+  END IF;
+
+  -- The unique indexes settle concurrent assigns: whoever loses inserts nothing
+  INSERT INTO patients_room (patient_id, room_id, assigned_by)
+  VALUES (pid, target_room, 'Haven AI')
+  ON CONFLICT DO NOTHING
+  RETURNING * INTO assigned;
+
+  IF NOT FOUND THEN
+    IF EXISTS (SELECT 1 FROM patients_room WHERE room_id = target_room) THEN
+      RETURN json_build_object('error', 'occupied');
+    END IF;
+    RETURN json_build_object('error', 'already_assigned');
+  END IF;
+
+  RETURN json_build_object(
+    'patient_id', assigned.patient_id,
+    'patient_name', patient_name,
+    'room_id', assigned.room_id
+  );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,18 @@
+-- Migration: Indexes for the remaining get_active_alerts filter + order shapes
+-- Completes the audit of every WHERE/ORDER BY in app/ai_tools.py against the
+-- indexes from 005, 008, 009, 018, 021 and 022; these were the shapes still
+-- served by a scan and sort.
+-- Run this in your Supabase SQL editor
+
+-- get_active_alerts pages by the (triggered_at, id) keyset, newest first.
+-- Default feed: status = 'active' (plus the optional severity filter, which
+-- hospital_stats' GROUP BY severity also reads)
+CREATE INDEX IF NOT EXISTS idx_alerts_active_triggered
+    ON alerts(triggered_at DESC, id DESC) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_alerts_active_severity_triggered
+    ON alerts(severity, triggered_at DESC, id DESC) WHERE status = 'active';
+
+-- Room history: room_id = ?, any status
+-- (the patient equivalent is idx_alerts_patient_triggered from 018)
+CREATE INDEX IF NOT EXISTS idx_alerts_room_triggered
+    ON alerts(room_id, triggered_at DESC, id DESC);
@@ -0,0 +1,8 @@
+-- Migration: Drop the server-side room matcher from 009
+-- get_room_status now matches rooms with fuzzy_match_room over the cached room
+-- index, like the assign/transfer/remove tools, so a query can't resolve to a
+-- different room depending on which matcher ran. Nothing calls find_room anymore.
+-- Run this in your Supabase SQL editor
+
+DROP FUNCTION IF EXISTS find_room(TEXT);
+DROP INDEX IF EXISTS idx_rooms_name_trgm;
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the AI tools' retry rules for transient Supabase errors
+Run: python test_ai_tools_retry.py (or pytest test_ai_tools_retry.py)
+"""
+
+import asyncio
+import sys
+sys.path.insert(0, '.')
+
+from postgrest.exceptions import APIError
+
+from app import ai_tools
+
+# No backoff sleeps while testing
+ai_tools.RETRY_BASE_DELAY = 0
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Stands in for a postgrest request builder: fails with the given error codes, then returns data"""
+
+    def __init__(self, http_method, failures, data):
+        self.http_method = http_method
+        self.failures = list(failures)
+        self.data = data
+        self.calls = 0
+
+    def limit(self, size):
+        return self
+
+    def execute(self):
+        self.calls += 1
+        if self.failures:
+            raise APIError({"message": "transient", "code": self.failures.pop(0)})
+        return FakeResponse(self.data)
+
+
+def test_read_only_rpc_is_retried():
+    """A 503 on a read-only RPC (sent as POST) is retried"""
+    query = FakeQuery("POST", ["503"], {"total_patients": 3})
+    response = asyncio.run(ai_tools._execute(query, read_only=True))
+    assert response.data == {"total_patients": 3}
+    assert query.calls == 2
+
+
+def test_write_rpc_is_not_retried():
+    """A 503 on a write RPC might have reached Postgres, so it is raised"""
+    query = FakeQuery("POST", ["503"], {})
+    try:
+        asyncio.run(ai_tools._execute(query))
+    except APIError as e:
+        assert e.code == "503"
+    else:
+        raise AssertionError("write RPC was retried")
+    assert query.calls == 1
+
+
+def test_fetch_one_is_retried():
+    """_fetch_one retries a gateway error and returns the first row"""
+    query = FakeQuery("GET", ["502", "PGRST001"], [{"patient_id": "P-001"}])
+    row = asyncio.run(ai_tools._fetch_one(query))
+    assert row == {"patient_id": "P-001"}
+    assert query.calls == 3
+
+
+def test_fetch_one_no_row():
+    """_fetch_one returns None when nothing matched"""
+    query = FakeQuery("GET", [], [])
+    assert asyncio.run(ai_tools._fetch_one(query)) is None
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🔁 TESTING AI TOOL RETRIES")
+    print("=" * 60)
+    for test in (test_read_only_rpc_is_retried, test_write_rpc_is_not_retried, test_fetch_one_is_retried, test_fetch_one_no_row):
+        test()
+        print(f"   ✅ {test.__name__}")
+    print("\n✅ All retry tests passed")